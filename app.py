@@ -0,0 +1,194 @@
+import asyncio
+import gc
+import time
+from problems import TopK
+
+# Touch is scanned this often; a tap is handled within one scan
+TOUCH_SECONDS = 0.02
+HOUSEKEEPING_SECONDS = 5
+
+async def drive(steps):
+    """Runs one of the icinga *_steps generators to completion, handing
+    control to the other tasks at every step. Returns its result."""
+    try:
+        while True:
+            next(steps)
+            await asyncio.sleep(0)
+    except StopIteration as e:
+        return e.value
+
+class App:
+    """The poll mode main loop as cooperative asyncio tasks, so touch and
+    paging are served while a response is still arriving:
+
+    poll_task polls the aggregator as endpoints come due and draws each
+    cycle, render_task redraws whenever redraw is set, page_task turns
+    pages every page_seconds, touch_task turns a page or wakes the
+    backlight on a tap, and housekeeping_task collects garbage and lets
+    the backlight dim while idle.
+
+    touch is anything with a touch_point property, such as
+    adafruit_touchscreen.Touchscreen, or None for no touch scanning.
+    Scanning touch or turning pages keeps the board awake; with neither,
+    waits between polls use power.sleep, and light sleep where the
+    runtime has it, as the synchronous loop did.
+
+    Only the gaps between socket reads are shared: each session.get and
+    each chunk read inside icinga's results_steps still blocks, since
+    adafruit_requests has no non-blocking reads. Touch and paging latency
+    is bounded by the slowest single read, not by the whole fetch.
+
+    top may be a TopK already on screen from a snapshot.Snapshot. It is
+    treated as stale: it stays up until a poll succeeds, with any errors
+    on the bottom row. Each successful poll is then offered to snapshot
+    to save."""
+
+    def __init__(self, screen, aggregator, power, telemetry, keep, page_seconds=0, touch=None, reconnect=None, overlay=False, top=None, snapshot=None):
+        self.screen = screen
+        self.aggregator = aggregator
+        self.power = power
+        self.telemetry = telemetry
+        self.page_seconds = page_seconds
+        self.touch = touch
+        self.reconnect = reconnect
+        self.overlay = overlay
+
+        self.top = top if top is not None else TopK(keep)
+        self.stale = top is not None
+        self.snapshot = snapshot
+        self.page = 0
+        self.next_page = 0
+        self.redraw = asyncio.Event()
+        self.taps = 0
+
+        # Renders between polls count towards the next cycle's line
+        telemetry.begin()
+
+    async def run(self):
+        tasks = [
+            asyncio.create_task(self.poll_task()),
+            asyncio.create_task(self.render_task()),
+            asyncio.create_task(self.housekeeping_task()),
+        ]
+        if self.page_seconds:
+            tasks.append(asyncio.create_task(self.page_task()))
+        if self.touch is not None:
+            tasks.append(asyncio.create_task(self.touch_task()))
+        await asyncio.gather(*tasks)
+
+    def has_problems(self):
+        return self.top.count > 0 or bool(self.aggregator.errors())
+
+    def draw(self):
+        telemetry = self.telemetry
+        start = telemetry.start()
+        cells = self.screen.draw_items(self.top, self.page)
+        errors = self.aggregator.errors()
+        if errors:
+            cells += self.screen.draw_error(errors[0])
+        telemetry.stop("render", start)
+        telemetry.add("cells", cells)
+
+    def turn_page(self, now):
+        # Pages come from the items already kept, no fetching needed
+        self.page = (self.page + 1) % self.screen.page_count(self.top)
+        self.next_page = now + self.page_seconds
+        self.redraw.set()
+
+    async def poll_task(self):
+        aggregator = self.aggregator
+        telemetry = self.telemetry
+        while True:
+            now = time.monotonic()
+            changed = await drive(aggregator.poll_steps(now))
+            for endpoint in aggregator.polled:
+                c = endpoint.client
+                telemetry.add("fetch", c.wait_ns() // 1000000)
+                telemetry.add("parse", (c.fetch_ns() - c.wait_ns()) // 1000000)
+                telemetry.add("bytes", c.bytes_received())
+            if aggregator.polled and aggregator.errors() and self.reconnect is not None:
+                self.reconnect()
+
+            now = time.monotonic()
+            errors = aggregator.errors()
+            if self.stale and len(errors) == len(aggregator.endpoints):
+                # Nothing newer than the snapshot yet
+                if changed:
+                    self.screen.draw_error(errors[0])
+                changed = False
+            elif changed:
+                self.stale = False
+                start = telemetry.start()
+                aggregator.merge(self.top)
+                telemetry.stop("sort", start)
+                self.page = 0
+                self.next_page = now + self.page_seconds
+                self.draw()
+            if self.snapshot is not None and not errors:
+                self.snapshot.save(self.top, now)
+
+            wake = aggregator.next_poll()
+            if aggregator.polled:
+                self.power.update(now, self.has_problems(), changed)
+                telemetry.add("next", int(wake - now))
+                telemetry.add("failures", aggregator.failures())
+                self.finish_cycle()
+
+            delay = wake - time.monotonic()
+            if delay > 0 and self.touch is None and not self.page_seconds:
+                # No other task needs the board before the next poll
+                self.power.sleep(delay)
+                delay = 0
+            # Always yield, even when another endpoint is already due
+            await asyncio.sleep(delay if delay > 0 else 0)
+
+    def finish_cycle(self):
+        telemetry = self.telemetry
+        telemetry.collect()
+        telemetry.add("duty", self.power.duty_cycle())
+        if self.overlay:
+            self.screen.draw_status(telemetry.overlay())
+        telemetry.emit()
+        telemetry.begin()
+
+    async def render_task(self):
+        while True:
+            await self.redraw.wait()
+            self.redraw.clear()
+            self.draw()
+
+    async def page_task(self):
+        while True:
+            now = time.monotonic()
+            delay = self.next_page - now
+            if delay > 0:
+                # A poll or a tap may have moved next_page meanwhile
+                await asyncio.sleep(delay)
+            elif self.screen.page_count(self.top) > 1:
+                self.turn_page(now)
+            else:
+                self.next_page = now + self.page_seconds
+
+    async def touch_task(self):
+        pressed = False
+        while True:
+            point = self.touch.touch_point
+            if point and not pressed:
+                self.tap(time.monotonic())
+            pressed = bool(point)
+            await asyncio.sleep(TOUCH_SECONDS)
+
+    def tap(self, now):
+        # The first tap on a dimmed screen only wakes it
+        self.taps += 1
+        dimmed = self.power.brightness != self.power.full
+        self.power.update(now, self.has_problems(), True)
+        if not dimmed and self.screen.page_count(self.top) > 1:
+            self.turn_page(now)
+
+    async def housekeeping_task(self):
+        while True:
+            await asyncio.sleep(HOUSEKEEPING_SECONDS)
+            gc.collect()
+            # Lets the backlight dim between polls, not only at them
+            self.power.update(time.monotonic(), self.has_problems(), False)
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# Frame-time benchmark for the display pipeline, run under desktop Python
+# against the sim_displayio stand-ins.
+#
+# Each recorded cycle is a JSON file holding the raw API responses as
+# {"services": {"results": [...]}, "hosts": {"results": [...]}}. Without
+# any, a synthetic outage is generated that changes a few items per cycle.
+#
+#   python3 bench.py recorded/*.json
+#   python3 bench.py --items 500 --cycles 50
+
+import argparse
+import json
+import random
+import time
+
+import sim_displayio
+sim_displayio.install()
+
+import jsonstream
+from problems import TopK
+from screen import Screen, BLOCK_COUNT
+
+CHUNK_SIZE = 512
+
+def load_cycles(filenames):
+    cycles = []
+    for filename in filenames:
+        with open(filename, "rb") as file:
+            data = json.load(file)
+        cycles.append((json.dumps(data["services"]).encode(), json.dumps(data["hosts"]).encode()))
+    return cycles
+
+def synthetic_cycles(item_count, cycle_count, seed):
+    rng = random.Random(seed)
+    now = 1600000000
+    services = []
+    hosts = []
+    for i in range(item_count):
+        host = "host-{:04d}".format(rng.randrange(item_count // 4 + 1))
+        if rng.random() < 0.02:
+            hosts.append({"type": "Host", "name": host, "attrs": {"state": 1.0, "last_hard_state_change": now - rng.randrange(86400)}})
+        else:
+            services.append({"type": "Service", "name": host + "!service-" + str(i), "attrs": {"state": float(rng.randrange(1, 4)), "last_hard_state_change": now - rng.randrange(86400)}})
+
+    cycles = []
+    for c in range(cycle_count):
+        for i in range(3):
+            item = rng.choice(services)
+            item["attrs"]["state"] = float(rng.randrange(1, 4))
+            item["attrs"]["last_hard_state_change"] = now + c * 30
+        cycles.append((
+            json.dumps({"results": [dict(s, joins={}, meta={}) for s in services]}).encode(),
+            json.dumps({"results": [dict(h, joins={}, meta={}) for h in hosts]}).encode(),
+        ))
+    return cycles
+
+def chunks(payload):
+    for i in range(0, len(payload), CHUNK_SIZE):
+        yield payload[i:i + CHUNK_SIZE]
+
+def run(cycles, font_dir):
+    stats = sim_displayio.stats
+    screen = Screen(font_dir)
+    rows = []
+    for services, hosts in cycles:
+        stats.reset()
+
+        start = time.perf_counter_ns()
+        items = list(jsonstream.iter_results(chunks(services)))
+        items += jsonstream.iter_results(chunks(hosts))
+        parsed = time.perf_counter_ns()
+
+        top = TopK(BLOCK_COUNT)
+        for item in items:
+            top.add(item)
+        sorted_ = time.perf_counter_ns()
+
+        cells = screen.draw_items(top)
+        rendered = time.perf_counter_ns()
+
+        rows.append((len(services) + len(hosts), len(items), (parsed - start) / 1e6, (sorted_ - parsed) / 1e6,
+            (rendered - sorted_) / 1e6, cells, stats.dirty_pixels))
+    return rows, screen
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark parse, sort and render costs per poll cycle")
+    parser.add_argument("recorded", nargs="*", help="recorded cycle JSON files")
+    parser.add_argument("--items", type=int, default=200, help="synthetic problem count")
+    parser.add_argument("--cycles", type=int, default=20, help="synthetic cycle count")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--fonts", default="fonts")
+    args = parser.parse_args()
+
+    if args.recorded:
+        cycles = load_cycles(args.recorded)
+    else:
+        cycles = synthetic_cycles(args.items, args.cycles, args.seed)
+
+    rows, screen = run(cycles, args.fonts)
+
+    print("{:>5} {:>9} {:>6} {:>9} {:>9} {:>9} {:>6} {:>8}".format("cycle", "bytes", "items", "parse ms", "sort ms", "render ms", "cells", "dirty px"))
+    for i in range(len(rows)):
+        print("{:>5} {:>9} {:>6} {:>9.2f} {:>9.2f} {:>9.2f} {:>6} {:>8}".format(i, *rows[i]))
+
+    cache = screen.glyph_cache
+    print("glyph cache: {} hits, {} misses, {} evictions".format(cache.hits, cache.misses, cache.evictions))
+
+if __name__ == "__main__":
+    main()
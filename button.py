@@ -66,11 +66,14 @@ class Button():
     :param fill_color: The color to fill the button. Defaults to 0xFFFFFF.
     :param outline_color: The color of the outline of the button.
     :param label: The text that appears inside the button. Defaults to not displaying the label.
-    :param label_font: The button label font.
+    :param label_font: The button label font, or with ``label_cache`` the index of a
+                       font in its glyph cache. Defaults to 0 with ``label_cache``.
     :param label_color: The color of the button label text. Defaults to 0x0.
     :param selected_fill: Inverts the fill color.
     :param selected_outline: Inverts the outline color.
     :param selected_label: Inverts the label color.
+    :param label_cache: A ``glyph_cache.LabelCache`` to draw the label from its shared tiles
+                        with a `TileLabel` instead of building a new ``Label`` per change.
 
     """
     RECT = const(0)
@@ -82,7 +85,7 @@ class Button():
                  fill_color=0xFFFFFF, outline_color=0x0,
                  label=None, label_font=None, label_color=0x0,
                  selected_fill=None, selected_outline=None,
-                 selected_label=None, icon=None):
+                 selected_label=None, icon=None, label_cache=None):
         self.x = x
         self.y = y
         self.width = width
@@ -92,6 +95,7 @@ class Button():
         self.group = displayio.Group()
         self.name = name
         self._label = label
+        self._label_cache = label_cache
         self._icon = icon
         self.body = self.fill = self.shadow = None
 
@@ -138,15 +142,19 @@ class Button():
         # self.group.append(self.bodyshape)
 
     def _position_label(self):
-        if not self._label or not isinstance(self._label, Label):
+        if not self._label or not isinstance(self._label, (Label, TileLabel)):
             return
-        
+
         dims = self._label.bounding_box
         iconw = self._icon_bitmap.width if self._icon_bitmap else 0
         if dims[2] >= (self.width - iconw) or dims[3] >= self.height:
             raise RuntimeError("Button not large enough for label")
         self._label.x = self.x + iconw + (self.width - iconw - dims[2]) // 2
-        self._label.y = self.y + self.height // 2
+        if isinstance(self._label, TileLabel):
+            # Tiles are placed by their top edge, text by its baseline
+            self._label.y = self.y + (self.height - dims[3]) // 2
+        else:
+            self._label.y = self.y + self.height // 2
         self._label.color = self._label_color
 
     @property
@@ -156,6 +164,10 @@ class Button():
 
     @label.setter
     def label(self, newtext):
+        if self._label_cache is not None:
+            self._set_tile_label(newtext)
+            return
+
         if self._label and (self._label in self.group):
             self.group.remove(self._label)
 
@@ -172,6 +184,19 @@ class Button():
         if (self.selected_label is None) and (self._label_color is not None):
             self.selected_label = (~self._label_color) & 0xFFFFFF
 
+    def _set_tile_label(self, newtext):
+        # One TileLabel per button, rewritten in place on every change
+        if not isinstance(self._label, TileLabel):
+            tile_width = self._label_cache.glyph_cache.tile_width
+            self._label = TileLabel(self._label_cache, (self.width - 1) // tile_width,
+                                    font=self._label_font or 0)
+            self.group.append(self._label)
+        self._label.text = newtext or ""
+        self._position_label()
+
+        if (self.selected_label is None) and (self._label_color is not None):
+            self.selected_label = (~self._label_color) & 0xFFFFFF
+
     @property
     def icon(self):
         """The text label of the button"""
@@ -227,4 +252,126 @@ class Button():
         determining that a button has been touched.
         """
         return (self.x <= point[0] <= self.x + self.width) and (self.y <= point[1] <=
-                                                                self.y + self.height)
\ No newline at end of file
+                                                                self.y + self.height)
+
+class TileLabel(displayio.TileGrid):
+    """One row of glyph tiles from a shared tile bitmap, used as a `Button` label in
+    place of a ``Label``. Text is encoded through a ``glyph_cache.LabelCache``, so a
+    relabel only rewrites tile indices and allocates no bitmap or group. The tiles
+    shown are pinned in the glyph cache so that other text cannot evict them.
+
+    :param label_cache: The ``glyph_cache.LabelCache`` whose tiles are drawn.
+    :param columns: The most characters the label can show.
+    :param font: The index of the font in the glyph cache. Defaults to 0.
+    :param color: The text color. Defaults to 0x0.
+    """
+
+    def __init__(self, label_cache, columns, *, font=0, color=0x0, x=0, y=0):
+        glyph_cache = label_cache.glyph_cache
+        palette = displayio.Palette(2)
+        palette[0] = 0
+        palette.make_transparent(0)
+        palette[1] = color
+        super().__init__(glyph_cache.bmp, pixel_shader=palette, x=x, y=y, width=columns, height=1,
+                         tile_width=glyph_cache.tile_width, tile_height=glyph_cache.tile_height)
+        self._palette = palette
+        self._label_cache = label_cache
+        self._font = font
+        self._columns = columns
+        self._cells = bytearray(columns)
+        self._text = ""
+
+    @property
+    def text(self):
+        """The text shown"""
+        return self._text
+
+    @text.setter
+    def text(self, text):
+        if len(text) > self._columns:
+            raise RuntimeError("Label longer than its tile row")
+        run = self._label_cache.encode(self._font, text)
+        glyph_cache = self._label_cache.glyph_cache
+        cells = self._cells
+        glyph_cache.unpin(cells)
+        for n in range(self._columns):
+            tile = run[n] if n < len(run) else 0
+            if cells[n] != tile:
+                cells[n] = tile
+                self[n, 0] = tile
+        glyph_cache.pin(cells)
+        self._text = text
+
+    @property
+    def color(self):
+        """The text color"""
+        return self._palette[1]
+
+    @color.setter
+    def color(self, color):
+        self._palette[1] = _check_color(color) if color is not None else 0
+
+    @property
+    def bounding_box(self):
+        """The (x, y, width, height) of the text within the label"""
+        glyph_cache = self._label_cache.glyph_cache
+        return (0, 0, len(self._text) * glyph_cache.tile_width, glyph_cache.tile_height)
+
+
+class ButtonGrid():
+    """Finds the button under a touch point without testing every button. Buttons
+    are indexed by the cells of a coarse grid over the screen that they cover, so a
+    lookup only checks the few buttons in one cell. Where buttons overlap, the one
+    added last wins, as it is drawn on top.
+
+    :param width: The screen width in pixels.
+    :param height: The screen height in pixels.
+    :param cell_size: The cell width and height in pixels. Defaults to 40.
+    """
+
+    def __init__(self, width, height, cell_size=40):
+        self.cell_size = cell_size
+        self.columns = width // cell_size + 1
+        self.rows = height // cell_size + 1
+        self.cells = [None] * (self.columns * self.rows)
+        self.buttons = []
+
+    def _cells(self, button):
+        # Every cell the button covers, including its right and bottom edges
+        size = self.cell_size
+        x0 = max(0, button.x // size)
+        x1 = min(self.columns - 1, (button.x + button.width) // size)
+        y0 = max(0, button.y // size)
+        y1 = min(self.rows - 1, (button.y + button.height) // size)
+        for cy in range(y0, y1 + 1):
+            for cx in range(x0, x1 + 1):
+                yield cy * self.columns + cx
+
+    def add(self, button):
+        """Adds a button to the index."""
+        self.buttons.append(button)
+        for n in self._cells(button):
+            if self.cells[n] is None:
+                self.cells[n] = []
+            self.cells[n].append(button)
+
+    def remove(self, button):
+        """Removes a button from the index. Remove it before changing its position or
+        size and add it again after."""
+        self.buttons.remove(button)
+        for n in self._cells(button):
+            self.cells[n].remove(button)
+
+    def find(self, point):
+        """Returns the button containing ``point``, such as a touch point, or None."""
+        cx = point[0] // self.cell_size
+        cy = point[1] // self.cell_size
+        if not (0 <= cx < self.columns and 0 <= cy < self.rows):
+            return None
+        buttons = self.cells[cy * self.columns + cx]
+        if buttons is None:
+            return None
+        for i in range(len(buttons) - 1, -1, -1):
+            if buttons[i].contains(point):
+                return buttons[i]
+        return None
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# Offline BDF to glyph atlas compiler. Runs under desktop Python, not on the
+# board; copy the resulting .atlas and .idx files to /fonts on the CIRCUITPY
+# drive.
+#
+#   python3 compile_bdf.py --atlas fonts/ctrld-fixed-13.atlas \
+#       fonts/ctrld-fixed-13r.bdf fonts/ctrld-fixed-13b.bdf
+#   python3 compile_bdf.py --index fonts/*.bdf
+
+import argparse
+import os
+import struct
+
+import render_bdf
+
+GLYPHS = b'0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ-,.:/! '
+TILE_COUNT = 160
+TILE_WIDTH = 7
+TILE_HEIGHT = 13
+
+class Canvas:
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.pixels = bytearray(width * height)
+
+    def __getitem__(self, index):
+        return self.pixels[index]
+
+    def __setitem__(self, index, value):
+        self.pixels[index] = value
+
+def pack_rows(canvas, width):
+    data = bytearray()
+    for y in range(canvas.height):
+        start = y * canvas.width
+        for x in range(0, width, 8):
+            val = 0
+            for j in range(8):
+                if x + j < width and canvas.pixels[start + x + j]:
+                    val |= 0x80 >> j
+            data.append(val)
+    return bytes(data)
+
+def compile_atlas(filenames, code_points, tile_width=TILE_WIDTH, tile_height=TILE_HEIGHT, tile_count=TILE_COUNT):
+    canvas = Canvas(tile_count * tile_width, tile_height)
+    maps = []
+    # Tile 0 stays blank, matching main.py
+    tile_index = 1
+    for filename in filenames:
+        map = render_bdf.render_bdf(filename, code_points, canvas, tile_width, tile_height, tile_index)
+        maps.append(map)
+        tile_index += len(map)
+    if tile_index > tile_count:
+        raise ValueError("Glyph set does not fit in {} tiles".format(tile_count))
+
+    data = bytearray(struct.pack(render_bdf.ATLAS_HEADER, render_bdf.ATLAS_MAGIC, render_bdf.ATLAS_VERSION,
+        tile_width, tile_height, len(maps), tile_index))
+    for map in maps:
+        data += struct.pack("<H", len(map))
+        for code_point in sorted(map):
+            data += struct.pack(render_bdf.ATLAS_ENTRY, code_point, map[code_point])
+    data += pack_rows(canvas, tile_index * tile_width)
+    return bytes(data)
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile BDF fonts into a packed glyph atlas and offset indexes")
+    parser.add_argument("fonts", nargs="+")
+    parser.add_argument("--atlas", help="write a glyph atlas for the fonts to this file")
+    parser.add_argument("--index", action="store_true", help="write a sidecar offset index next to each font")
+    parser.add_argument("--glyphs", default=GLYPHS.decode("utf-8"))
+    parser.add_argument("--tile-width", type=int, default=TILE_WIDTH)
+    parser.add_argument("--tile-height", type=int, default=TILE_HEIGHT)
+    parser.add_argument("--tile-count", type=int, default=TILE_COUNT)
+    args = parser.parse_args()
+
+    if args.index:
+        for filename in args.fonts:
+            index = render_bdf.build_index(filename)
+            render_bdf.save_index(filename, index, os.stat(filename).st_size)
+            print("Wrote {}{} ({} glyphs)".format(filename, render_bdf.INDEX_SUFFIX, len(index) // render_bdf.INDEX_ENTRY_SIZE))
+
+    if args.atlas:
+        code_points = [ord(c) for c in args.glyphs]
+        data = compile_atlas(args.fonts, code_points, args.tile_width, args.tile_height, args.tile_count)
+        with open(args.atlas, "wb") as file:
+            file.write(data)
+        print("Wrote {} ({} bytes)".format(args.atlas, len(data)))
+
+if __name__ == "__main__":
+    main()
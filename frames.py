@@ -0,0 +1,105 @@
+import struct
+
+# A frame is one page of the problem list as the tile indices of every
+# text row, rendered by gateway.py and drawn by Screen.draw_frame:
+#   header, then per visible block its bullet colour and top and bottom
+#   rows, then the bottom status row; every row is ROW_WIDTH bytes
+FRAME_MAGIC = b"ICGF"
+FRAME_VERSION = 1
+# magic, version, visible blocks, page, page count, tiles version
+FRAME_HEADER = "<4sBBBBL"
+FRAME_FILL = "<L"
+
+# The tile bitmap the indices refer to: header, the (font, code point)
+# each tile holds, then the pixels at one bit each, row by row
+TILES_MAGIC = b"ICGT"
+TILES_VERSION = 1
+# magic, version, tile count, tile width, tile height, tiles version
+TILES_HEADER = "<4sBxHBBL"
+# font, or NO_FONT for an empty tile, and code point
+TILES_OWNER = "<BH"
+NO_FONT = 0xFF
+
+def tiles_version(bmp):
+    """Checksum of a tile bitmap's pixels, changing whenever a glyph is
+    loaded into it. Desktop only."""
+    import zlib
+    return zlib.crc32(bytes(bmp.pixels))
+
+def frame_header(frame):
+    """Returns (visible, page, pages, tiles version) of a frame."""
+    magic, version, visible, page, pages, tiles = struct.unpack_from(FRAME_HEADER, frame, 0)
+    if magic != FRAME_MAGIC or version != FRAME_VERSION:
+        raise ValueError("Unsupported frame version")
+    return visible, page, pages, tiles
+
+def tiles_header(data):
+    """Returns the tiles version of tiles packed by encode_tiles."""
+    magic, version, tile_count, tile_width, tile_height, tiles = struct.unpack_from(TILES_HEADER, data, 0)
+    if magic != TILES_MAGIC or version != TILES_VERSION:
+        raise ValueError("Unsupported tiles version")
+    return tiles
+
+def encode_frame(screen, page, pages, tiles):
+    """Packs the page a screen.Screen last drew, under sim_displayio."""
+    visible = 0
+    for block in screen.blocks:
+        if block in screen.root:
+            visible += 1
+    frame = bytearray(struct.pack(FRAME_HEADER, FRAME_MAGIC, FRAME_VERSION, visible, page, pages, tiles))
+    for b in range(visible):
+        top_cells, bottom_cells = screen.block_cells[b]
+        frame += struct.pack(FRAME_FILL, screen.block_fills[b])
+        frame += top_cells
+        frame += bottom_cells
+    frame += screen.andthen_cells
+    return bytes(frame)
+
+def encode_tiles(glyph_cache):
+    """Packs a glyph cache's tile bitmap and layout, under sim_displayio."""
+    bmp = glyph_cache.bmp
+    data = bytearray(struct.pack(TILES_HEADER, TILES_MAGIC, TILES_VERSION, glyph_cache.tile_count,
+        glyph_cache.tile_width, glyph_cache.tile_height, tiles_version(bmp)))
+    for owner in glyph_cache.owners:
+        if owner is None:
+            data += struct.pack(TILES_OWNER, NO_FONT, 0)
+        else:
+            data += struct.pack(TILES_OWNER, owner[0], owner[1])
+
+    pixels = bmp.pixels
+    bits = bytearray((len(pixels) + 7) // 8)
+    for i in range(len(pixels)):
+        if pixels[i]:
+            bits[i >> 3] |= 0x80 >> (i & 7)
+    return bytes(data + bits)
+
+def apply_tiles(data, glyph_cache):
+    """Copies tiles packed by encode_tiles into a glyph cache's bitmap and
+    adopts their layout. Returns the tiles version."""
+    magic, version, tile_count, tile_width, tile_height, tiles = struct.unpack_from(TILES_HEADER, data, 0)
+    if magic != TILES_MAGIC or version != TILES_VERSION:
+        raise ValueError("Unsupported tiles version")
+    if (tile_count, tile_width, tile_height) != (glyph_cache.tile_count, glyph_cache.tile_width, glyph_cache.tile_height):
+        raise ValueError("Tile layout mismatch")
+
+    offset = struct.calcsize(TILES_HEADER)
+    owner_size = struct.calcsize(TILES_OWNER)
+    owners = []
+    for tile in range(tile_count):
+        font, code_point = struct.unpack_from(TILES_OWNER, data, offset)
+        offset += owner_size
+        owners.append(None if font == NO_FONT else (font, code_point))
+
+    bmp = glyph_cache.bmp
+    width = bmp.width
+    height = bmp.height
+    if len(data) - offset < (width * height + 7) // 8:
+        raise ValueError("Tiles cut short")
+    i = 0
+    for y in range(height):
+        for x in range(width):
+            bmp[x, y] = (data[offset + (i >> 3)] >> (7 - (i & 7))) & 1
+            i += 1
+
+    glyph_cache.adopt(owners)
+    return tiles
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+# Fan-out gateway for many panels. Runs under desktop Python, not on the
+# board: polls the Icinga2 API once for every panel, renders each page
+# with the same Screen code the board runs (against sim_displayio), and
+# serves the results in the frames.py format:
+#
+#   GET /frame?page=N  one page of tile indices and bullet colours
+#   GET /tiles         the tile bitmap those indices refer to
+#
+# Both carry an ETag and answer If-None-Match with 304, so an idle panel
+# costs a few hundred bytes per check. Panels use it by setting
+# secrets["gateway"] = {"url": "http://host:8080"}.
+#
+#   python3 gateway.py --config gateway.json --port 8080
+#   python3 gateway.py --stub 300
+#
+# The config file holds {"apis": [...]} as in secrets.py, and optionally
+# "page_limit". --stub serves synthetic problems instead, for testing
+# panels without an Icinga2 master.
+
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+import sim_displayio
+sim_displayio.install()
+
+import frames
+import icinga
+from problems import TopK
+from screen import Screen, BLOCK_COUNT
+
+POLL_SECONDS = 30
+
+class Gateway:
+    """Polls an icinga.Aggregator and renders pages on request. Rendered
+    frames are kept until the next change, per page."""
+
+    def __init__(self, aggregator, keep, font_dir="fonts"):
+        self.aggregator = aggregator
+        self.top = TopK(keep)
+        self.screen = Screen(font_dir, keep)
+        self.lock = threading.Lock()
+        # Bumped whenever the problem list or errors change
+        self.version = 0
+        self.frames = {}
+
+    def poll(self):
+        now = time.monotonic()
+        changed = self.aggregator.poll(now)
+        if changed:
+            with self.lock:
+                self.aggregator.merge(self.top)
+                self.version += 1
+                self.frames.clear()
+        for error in self.aggregator.errors():
+            print("Poll failed:", error)
+        return self.aggregator.next_poll()
+
+    def run(self):
+        while True:
+            delay = self.poll() - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+    def frame(self, page):
+        """Returns (etag, frame) for a page, rendering it if needed."""
+        with self.lock:
+            screen = self.screen
+            pages = screen.page_count(self.top)
+            page = min(max(page, 0), pages - 1)
+            cached = self.frames.get(page)
+            tiles = frames.tiles_version(screen.tiles)
+            # Rendering another page may have evicted tiles this one used
+            if cached is not None and frames.frame_header(cached[1])[3] == tiles:
+                return cached
+
+            screen.draw_items(self.top, page)
+            errors = self.aggregator.errors()
+            if errors:
+                screen.draw_error(errors[0])
+            tiles = frames.tiles_version(screen.tiles)
+            frame = frames.encode_frame(screen, page, pages, tiles)
+            cached = ('"{}.{}.{}"'.format(self.version, page, tiles), frame)
+            self.frames[page] = cached
+            return cached
+
+    def tiles(self):
+        """Returns (etag, tiles) for the tile bitmap."""
+        with self.lock:
+            data = frames.encode_tiles(self.screen.glyph_cache)
+        return '"{}"'.format(frames.tiles_header(data)), data
+
+def make_handler(gateway):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlsplit(self.path)
+            if url.path == "/frame":
+                try:
+                    page = int(parse_qs(url.query).get("page", ["0"])[0])
+                except ValueError:
+                    page = 0
+                etag, body = gateway.frame(page)
+            elif url.path == "/tiles":
+                etag, body = gateway.tiles()
+            else:
+                self.send_error(404)
+                return
+
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "application/octet-stream")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("ETag", etag)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+def stub_aggregator(item_count, keep):
+    # Synthetic outage, changing a few items per poll
+    from bench import synthetic_cycles
+    from sim_app import FakeSession
+    session = FakeSession(synthetic_cycles(item_count, 20, 1), 0)
+    client = icinga.IcingaClient(session, "stub", "user:pass")
+    return icinga.Aggregator([icinga.Endpoint(client, 10, keep)])
+
+def main():
+    parser = argparse.ArgumentParser(description="Poll Icinga2 once and serve rendered frames to panels")
+    parser.add_argument("--config", help="JSON file with an \"apis\" list as in secrets.py")
+    parser.add_argument("--stub", type=int, metavar="ITEMS", help="serve synthetic problems instead")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--fonts", default="fonts")
+    args = parser.parse_args()
+
+    config = {}
+    if args.config:
+        with open(args.config) as file:
+            config = json.load(file)
+    keep = BLOCK_COUNT * config.get("page_limit", 5)
+
+    if args.stub is not None:
+        aggregator = stub_aggregator(args.stub, keep)
+    elif config.get("apis"):
+        import requests
+        endpoints = []
+        for api in config["apis"]:
+            client = icinga.IcingaClient(requests.Session(), api["host"], api["credentials"], api.get("scheme", "https"),
+                exclude_acknowledged=api.get("exclude_acknowledged", False), exclude_downtimed=api.get("exclude_downtimed", False))
+            endpoints.append(icinga.Endpoint(client, api.get("interval", POLL_SECONDS), keep))
+        aggregator = icinga.Aggregator(endpoints)
+    else:
+        parser.error("either --config with apis or --stub is required")
+
+    gateway = Gateway(aggregator, keep, args.fonts)
+    gateway.poll()
+    threading.Thread(target=gateway.run, daemon=True).start()
+
+    server = ThreadingHTTPServer(("", args.port), make_handler(gateway))
+    print("Serving frames on port", args.port)
+    server.serve_forever()
+
+if __name__ == "__main__":
+    main()
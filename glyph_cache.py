@@ -0,0 +1,184 @@
+import array
+import render_bdf
+
+class GlyphCache:
+    """Maps (font, code point) to tiles in a shared tile bitmap, loading
+    glyphs from the BDF files on a miss and evicting the least recently
+    used tile once the bitmap is full. Tile 0 is kept blank."""
+
+    def __init__(self, bmp, tile_width, tile_height, filenames, maps=None):
+        self.bmp = bmp
+        self.tile_width = tile_width
+        self.tile_height = tile_height
+        self.tile_count = bmp.width // tile_width
+        self.filenames = filenames
+        self.fonts = [None] * len(filenames)
+        self.maps = maps if maps is not None else [{} for f in filenames]
+
+        self.owners = [None] * self.tile_count
+        self.stamps = [0] * self.tile_count
+        # Tiles held by labels that stay on screen across frames
+        self.pins = array.array("H", [0] * self.tile_count)
+        self.frame = 1
+        for font in range(len(self.maps)):
+            for code_point, tile in self.maps[font].items():
+                self.owners[tile] = (font, code_point)
+        self.free = [tile for tile in range(self.tile_count - 1, 0, -1) if self.owners[tile] is None]
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # Bumped on eviction, when tile indices handed out before may be stale
+        self.generation = 0
+
+    def begin_frame(self):
+        # Tiles used since the last call are on screen and must not be evicted
+        self.frame += 1
+
+    def lookup(self, font, code_point):
+        map = self.maps[font]
+        tile = map.get(code_point)
+        if tile is not None:
+            self.hits += 1
+            self.stamps[tile] = self.frame
+            return tile
+
+        self.misses += 1
+        return self._load(font, code_point)
+
+    def touch(self, tiles):
+        # Marks tiles used in this frame without looking them up
+        stamps = self.stamps
+        frame = self.frame
+        for tile in tiles:
+            stamps[tile] = frame
+
+    def pin(self, tiles):
+        # Keeps tiles from eviction until unpinned, for text drawn outside
+        # of the frames begin_frame counts
+        pins = self.pins
+        for tile in tiles:
+            if tile:
+                pins[tile] += 1
+
+    def unpin(self, tiles):
+        pins = self.pins
+        for tile in tiles:
+            if tile:
+                pins[tile] -= 1
+
+    def adopt(self, owners):
+        # Takes over the layout of a tile bitmap copied in from elsewhere,
+        # given as (font, code point) or None for each tile
+        for map in self.maps:
+            map.clear()
+        for tile in range(1, self.tile_count):
+            owner = owners[tile]
+            self.owners[tile] = owner
+            self.stamps[tile] = 0
+            if owner is not None:
+                self.maps[owner[0]][owner[1]] = tile
+        self.free = [tile for tile in range(self.tile_count - 1, 0, -1) if self.owners[tile] is None]
+        self.generation += 1
+
+    def _font(self, font):
+        if self.fonts[font] is None:
+            self.fonts[font] = render_bdf.open_font(self.filenames[font])
+        return self.fonts[font]
+
+    def _allocate(self):
+        if self.free:
+            return self.free.pop()
+
+        stamps = self.stamps
+        pins = self.pins
+        frame = self.frame
+        tile = 0
+        oldest = frame
+        for i in range(1, self.tile_count):
+            if stamps[i] < oldest and not pins[i]:
+                oldest = stamps[i]
+                tile = i
+        if tile == 0:
+            return 0
+
+        font, code_point = self.owners[tile]
+        del self.maps[font][code_point]
+        self.owners[tile] = None
+        self.evictions += 1
+        self.generation += 1
+        return tile
+
+    def _load(self, font, code_point):
+        file, bounds, index = self._font(font)
+        offset = render_bdf.find_offset(index, code_point)
+        if offset is None:
+            # Not in the font; remember it as blank
+            self.maps[font][code_point] = 0
+            return 0
+
+        tile = self._allocate()
+        if tile == 0:
+            # Every tile is on screen this frame
+            return 0
+
+        file.seek(offset)
+        render_bdf.render_glyph(file, bounds, self.bmp, self.tile_width, self.tile_height, tile)
+        self.maps[font][code_point] = tile
+        self.owners[tile] = (font, code_point)
+        self.stamps[tile] = self.frame
+        return tile
+
+class LabelCache:
+    """Memoizes text fragments as runs of tile indices from a GlyphCache,
+    so repeated labels and names skip the per-character lookups. Once size
+    runs are held, those least recently used are dropped to make room, so
+    labels drawn on every frame stay. All runs are dropped when the glyph
+    cache evicts a tile, since any of them may point at it."""
+
+    def __init__(self, glyph_cache, size=64):
+        self.glyph_cache = glyph_cache
+        self.size = size
+        self.entries = [{} for f in glyph_cache.maps]
+        self.count = 0
+        self.generation = glyph_cache.generation
+
+    def clear(self):
+        for entries in self.entries:
+            entries.clear()
+        self.count = 0
+        self.generation = self.glyph_cache.generation
+
+    def encode(self, font, text):
+        glyph_cache = self.glyph_cache
+        if self.generation != glyph_cache.generation:
+            self.clear()
+
+        entries = self.entries[font]
+        entry = entries.get(text)
+        if entry is not None:
+            if entry[1] != glyph_cache.frame:
+                glyph_cache.touch(entry[0])
+                entry[1] = glyph_cache.frame
+            return entry[0]
+
+        run = bytes([glyph_cache.lookup(font, ord(c)) for c in text])
+        if self.generation != glyph_cache.generation:
+            self.clear()
+        elif self.count >= self.size:
+            self.evict()
+        entries[text] = [run, glyph_cache.frame]
+        self.count += 1
+        return run
+
+    def evict(self):
+        # Drops every run last used in the oldest frame any run was
+        oldest = self.glyph_cache.frame
+        for entries in self.entries:
+            for entry in entries.values():
+                if entry[1] < oldest:
+                    oldest = entry[1]
+        for entries in self.entries:
+            for text in [text for text, entry in entries.items() if entry[1] == oldest]:
+                del entries[text]
+                self.count -= 1
@@ -0,0 +1,259 @@
+import json
+import time
+import jsonstream
+from problems import TopK
+from scheduler import PollScheduler
+
+try:
+    from adafruit_requests import OutOfRetries
+except ImportError:
+    # Desktop requests raises OSError subclasses for the same failures
+    OutOfRetries = OSError
+
+# What a fetch can fail with: socket and TLS errors, bad statuses, broken
+# JSON, and adafruit_requests giving up on a connection
+FETCH_ERRORS = (OSError, RuntimeError, ValueError, OutOfRetries)
+
+def objects_path(kind, exclude_acknowledged=False, exclude_downtimed=False):
+    """Builds the tightest objects query for non-OK hard states: only the
+    two attributes the display uses, no joins and no meta. Acknowledged
+    or downtimed problems can also be filtered out by the server."""
+    filter = kind + ".state!=0%26%26" + kind + ".state_type==1"
+    if exclude_acknowledged:
+        filter += "%26%26" + kind + ".acknowledgement==0"
+    if exclude_downtimed:
+        filter += "%26%26" + kind + ".downtime_depth==0"
+    return "/v1/objects/" + kind + "s?filter=" + filter + "&attrs=state&attrs=last_hard_state_change"
+EVENTS_PATH = "/v1/events"
+EVENT_TYPES = ["StateChange", "CheckResult"]
+CHUNK_SIZE = 512
+
+def run(steps):
+    """Runs one of the *_steps generators to completion and returns its
+    result. The steps forms yield between items so that an asyncio task
+    can hand control to other tasks while a response is still arriving."""
+    try:
+        while True:
+            next(steps)
+    except StopIteration as e:
+        return e.value
+
+class IcingaClient:
+    """Issues Icinga2 API queries over one requests session so that
+    consecutive queries reuse the same keep-alive connection and only the
+    first pays for the TLS handshake. Works with adafruit_requests on the
+    board and with requests.Session on a desktop.
+
+    The event stream stays open while snapshots are fetched, so it needs
+    a connection of its own: adafruit_requests closes a session's last
+    response on its next request. events_session defaults to session,
+    which is enough for requests.Session."""
+
+    _counted = 0
+    _waited = 0
+
+    def __init__(self, session, host, credentials, scheme="https", timeout=30, exclude_acknowledged=False, exclude_downtimed=False, events_session=None):
+        self.session = session
+        self.events_session = events_session if events_session is not None else session
+        self.host = host
+        self.base_url = scheme + "://" + host
+        self.timeout = timeout
+        self.services_path = objects_path("service", exclude_acknowledged, exclude_downtimed)
+        self.hosts_path = objects_path("host", exclude_acknowledged, exclude_downtimed)
+        self.headers = {
+            "Authorization": "Basic " + credentials,
+            "Connection": "keep-alive",
+        }
+        # Last request duration and time spent waiting on the network, in
+        # nanoseconds, and body size in bytes, by path
+        self.timings = {}
+        self.waits = {}
+        self.received = {}
+
+    def results_steps(self, path, add):
+        """Streams the results of an objects query, passing each
+        (type, name, state, last_hard_state_change) item to add. Yields
+        after each item so a cooperative caller can run other tasks
+        between socket reads, and returns the status code and, on error,
+        the response text."""
+        start = time.monotonic_ns()
+        received = 0
+        self._counted = 0
+        response = self.session.get(self.base_url + path, headers=self.headers, stream=True, timeout=self.timeout)
+        # Connecting and waiting for the headers count as network time
+        self._waited = time.monotonic_ns() - start
+        try:
+            status_code = response.status_code
+            if status_code != 200:
+                text = response.text
+                received = len(text)
+                return status_code, text
+
+            chunks = self._count(response.iter_content(CHUNK_SIZE))
+            for item in jsonstream.iter_results(chunks):
+                add(item)
+                yield
+            # Drain the tail so the socket can be reused
+            for chunk in chunks:
+                yield
+            return status_code, None
+        finally:
+            response.close()
+            self.timings[path] = time.monotonic_ns() - start
+            self.waits[path] = self._waited
+            self.received[path] = received + self._counted
+
+    def _count(self, chunks):
+        chunks = iter(chunks)
+        while True:
+            start = time.monotonic_ns()
+            chunk = next(chunks, None)
+            self._waited += time.monotonic_ns() - start
+            if chunk is None:
+                return
+            self._counted += len(chunk)
+            yield chunk
+
+    def bytes_received(self):
+        # Body bytes of the last fetch
+        return self.received.get(self.services_path, 0) + self.received.get(self.hosts_path, 0)
+
+    def fetch_ns(self):
+        return self.timings.get(self.services_path, 0) + self.timings.get(self.hosts_path, 0)
+
+    def wait_ns(self):
+        # The rest of fetch_ns is parsing and item selection
+        return self.waits.get(self.services_path, 0) + self.waits.get(self.hosts_path, 0)
+
+    def fetch(self, add):
+        """Runs the services and hosts queries, passing every item to add.
+        Returns None on success, otherwise the error response text."""
+        return run(self.fetch_steps(add))
+
+    def fetch_steps(self, add):
+        # Generator form of fetch, see results_steps
+        for path in (self.services_path, self.hosts_path):
+            status_code, error = yield from self.results_steps(path, add)
+            if status_code != 200:
+                return error
+        return None
+
+    def events(self, queue, types=EVENT_TYPES):
+        """Subscribes to the event stream and yields each event as a dict.
+        Returns when the server closes the stream."""
+        return self.read_events(self.subscribe(queue, types))
+
+    def subscribe(self, queue, types=EVENT_TYPES):
+        """Opens the event stream and returns its response once the headers
+        are in. Events raised from then on queue up on it unread, so a
+        snapshot taken next misses none of them; pass it to read_events."""
+        headers = {
+            "Authorization": self.headers["Authorization"],
+            "Accept": "application/json",
+        }
+        body = {"queue": queue, "types": types}
+        response = self.events_session.post(self.base_url + EVENTS_PATH, json=body, headers=headers, stream=True)
+        if response.status_code != 200:
+            response.close()
+            raise RuntimeError("Event stream returned " + str(response.status_code))
+        return response
+
+    def read_events(self, response):
+        """Yields each event from a subscribe response as a dict, closing
+        it when the server ends the stream or the caller stops."""
+        try:
+            # One JSON document per line
+            buffer = b""
+            for chunk in response.iter_content(256):
+                buffer += chunk
+                while True:
+                    end = buffer.find(b"\n")
+                    if end < 0:
+                        break
+                    line = buffer[:end]
+                    buffer = buffer[end + 1:]
+                    if line.strip():
+                        yield json.loads(line)
+        finally:
+            response.close()
+
+class Endpoint:
+    """One API endpoint polled on its own adaptive schedule. top holds the
+    result of the last successful poll and error the last failure, if any."""
+
+    def __init__(self, client, interval, size):
+        self.client = client
+        self.scheduler = PollScheduler(interval)
+        self.next_poll = 0
+        self.top = TopK(size)
+        self.pending = TopK(size)
+        self.error = None
+        self.digest = None
+
+    def poll(self, now):
+        """Polls the endpoint. Returns True if its items or error changed."""
+        return run(self.poll_steps(now))
+
+    def poll_steps(self, now):
+        # Generator form of poll, yielding while the fetch is in flight
+        self.pending.reset()
+        try:
+            error = yield from self.client.fetch_steps(self.pending.add)
+        except FETCH_ERRORS as e:
+            error = str(e)
+
+        if error is None:
+            # Keep the previous results until a poll completes
+            self.top, self.pending = self.pending, self.top
+        else:
+            error = self.client.host + ": " + error
+
+        digest = (self.top.count, self.top.digest, hash(error))
+        changed = digest != self.digest
+        self.digest = digest
+        self.error = error
+
+        if error is None:
+            self.next_poll = self.scheduler.success(now, changed, self.top.count > 0)
+        else:
+            self.next_poll = self.scheduler.failure(now)
+        return changed
+
+class Aggregator:
+    """Merges the problems of several endpoints, each polled on its own
+    interval. A failing endpoint keeps its last results and reports its
+    error without holding up the others."""
+
+    def __init__(self, endpoints):
+        self.endpoints = endpoints
+        # Endpoints polled by the last call to poll
+        self.polled = []
+
+    def poll(self, now):
+        """Polls every endpoint that is due. Returns True if any changed."""
+        return run(self.poll_steps(now))
+
+    def poll_steps(self, now):
+        # Generator form of poll, yielding while fetches are in flight
+        changed = False
+        del self.polled[:]
+        for endpoint in self.endpoints:
+            if now >= endpoint.next_poll:
+                self.polled.append(endpoint)
+                if (yield from endpoint.poll_steps(now)):
+                    changed = True
+        return changed
+
+    def next_poll(self):
+        return min(endpoint.next_poll for endpoint in self.endpoints)
+
+    def merge(self, top):
+        top.reset()
+        for endpoint in self.endpoints:
+            top.merge(endpoint.top)
+
+    def failures(self):
+        return max(endpoint.scheduler.failures for endpoint in self.endpoints)
+
+    def errors(self):
+        return [endpoint.error for endpoint in self.endpoints if endpoint.error is not None]
@@ -0,0 +1,86 @@
+import json
+
+RESULTS_KEY = b'"results"'
+
+def parse_item(data):
+    # Keep only the fields the display uses
+    item = json.loads(data)
+    attrs = item["attrs"]
+    return (item["type"], item["name"], int(attrs["state"]), int(attrs["last_hard_state_change"]))
+
+def iter_results(chunks, parse=parse_item):
+    """Yields parse(element) for each object in the top-level "results"
+    array of an Icinga2 API response, read from an iterable of byte chunks.
+    Only one element is held in memory at a time."""
+    chunks = iter(chunks)
+
+    buffer = b""
+    while True:
+        chunk = next(chunks, None)
+        if chunk is None:
+            raise ValueError("No results array")
+        buffer += chunk
+        start = buffer.find(RESULTS_KEY)
+        if start < 0:
+            # Keep enough to match a key split across chunks
+            buffer = buffer[-len(RESULTS_KEY):]
+            continue
+        bracket = buffer.find(b"[", start)
+        if bracket >= 0:
+            data = buffer[bracket + 1:]
+            break
+    buffer = None
+
+    depth = 0
+    in_string = False
+    escape = False
+    parts = []
+    while True:
+        n = len(data)
+        start = 0
+        i = 0
+        while i < n:
+            if escape:
+                escape = False
+                i += 1
+                continue
+
+            if in_string:
+                quote = data.find(b'"', i)
+                end = quote if quote >= 0 else n
+                backslash = data.find(b"\\", i, end)
+                if backslash >= 0:
+                    escape = True
+                    i = backslash + 1
+                elif quote < 0:
+                    i = n
+                else:
+                    in_string = False
+                    i = quote + 1
+                continue
+
+            b = data[i]
+            if b == 0x22: # "
+                in_string = True
+            elif b == 0x7B or b == 0x5B: # { [
+                if depth == 0:
+                    start = i
+                depth += 1
+            elif b == 0x7D or b == 0x5D: # } ]
+                if depth == 0:
+                    # End of the results array
+                    return
+                depth -= 1
+                if depth == 0:
+                    parts.append(data[start:i + 1])
+                    element = b"".join(parts)
+                    parts = []
+                    yield parse(element)
+            i += 1
+
+        if depth > 0:
+            parts.append(data[start:])
+
+        data = next(chunks, None)
+        if data is None:
+            raise ValueError("Truncated results array")
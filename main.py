@@ -1,18 +1,20 @@
 import os
 import sys
-import gc
 import time
-import tzutil
 import board
-import displayio
 import terminalio
-import json
 import adafruit_pyportal
 import adafruit_requests as requests
 from adafruit_bitmap_font import bitmap_font
-from adafruit_display_shapes.rect import Rect
 from adafruit_display_text.label import Label
-import render_bdf
+import icinga
+import frames
+from scheduler import PollScheduler
+from problems import ProblemSet, TopK
+from screen import Screen, BLOCK_COUNT
+from telemetry import Telemetry
+from power import PowerManager
+from snapshot import Snapshot
 
 from secrets import secrets
 
@@ -20,221 +22,311 @@ def clear():
     for r in range(21):
         print("")
 
-def hour_to_12(h):
-    if h == 0:
-        return 12
-    if h > 12:
-        return h - 12
-    return h
-
-def hour_to_suffix(h):
-    if h < 12:
-        return "AM"
-    return "PM"
-
-def format_time(t):
-    return "{}-{:02d}-{:02d} {:02d}:{:02d}:{:02d} {}".format(
-        t.tm_year,
-        t.tm_mon,
-        t.tm_mday,
-        hour_to_12(t.tm_hour),
-        t.tm_min,
-        t.tm_sec,
-        hour_to_suffix(t.tm_hour),
-    )
-
-def render_text(grid, maps, text):
-    xs = 66
-    ys = 1
-    ts = len(text)
-    i = 0
-    map = 0
-    for y in range(ys):
-        for x in range(xs):
-            if i < ts:
-                while True:
-                    c = ord(text[i])
-                    i += 1
-                    if c > 10:
-                        break
-                    map = c
-
-                if c in maps[map]:
-                    grid[x, y] = maps[map][c]
-                else:
-                    grid[x, y] = 0
-            else:
-                grid[x, y] = 0
-
-def item_key(item):
-    attrs = item["attrs"]
-    state = int(attrs["state"])
-    last_hard_state_change = int(attrs["last_hard_state_change"])
-    last_hard_state_change_key = str(9999999999 - last_hard_state_change)
-
-    # Sort hosts before services
-    item_type = item["type"]
-    if item_type == "Host":
-        # Sort hosts by state: down, unreachable, up
-        state_key = 9
-        if state == 1: # Down
-            state_key = 0
-        elif state == 2: # Unreachable
-            state_key = 1
-            
-        return "0" + "_" + str(state_key) + "_" + last_hard_state_change_key
-    else:
-        # Sort services by state: critical, known, warning, ok
-        state_key = 9
-        if state == 2: # Critital
-            state_key = 0
-        elif state == 3: # Unknown
-            state_key = 1
-        elif state == 1: # Warning
-            state_key = 2
-            
-        return "1" + "_" + str(state_key) + "_" + last_hard_state_change_key
-
 clear()
-print("Connecting to wifi")
-
-wifi = adafruit_pyportal.wifi.WiFi(status_neopixel=board.NEOPIXEL)
-wifi.connect(secrets["wifi"]["ssid"], secrets["wifi"]["password"])
-
 print("Starting up")
 
-BLACK = 0x000000
-DGREY = 0x888888
-LGREY = 0xAAAAAA
-WHITE = 0xFFFFFF
-SERVICE_STATE_COLORS = [0x23BD7D, 0xFFA856, 0xFF4C68, 0xB33AF6]
-SERVICE_STATE_LABELS = ["OK", "WARNING", "CRITICAL", "UNKNOWN"]
-HOST_STATE_COLORS = [0x23BD7D, 0xFF4C68, 0xB33AF6]
-HOST_STATE_LABELS = ["UP", "DOWN", "UNREACHABLE"]
-
-palette_white = displayio.Palette(2)
-palette_white[0] = BLACK
-palette_white[1] = WHITE
-
-palette_grey = displayio.Palette(2)
-palette_grey[0] = BLACK
-palette_grey[1] = LGREY
-
-TILE_COUNT = 160
-TILE_WIDTH = 7
-TILE_HEIGHT = 13
-tiles = displayio.Bitmap(TILE_COUNT * TILE_WIDTH, TILE_HEIGHT, 2)
-
-glyphs = b'0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ-,.:/! '
-normal_map = render_bdf.render_bdf("/fonts/ctrld-fixed-13r.bdf", glyphs, tiles, TILE_WIDTH, TILE_HEIGHT, 1)
-bold_map = render_bdf.render_bdf("/fonts/ctrld-fixed-13b.bdf", glyphs, tiles, TILE_WIDTH, TILE_HEIGHT, len(normal_map) + 1)
-maps = [normal_map, bold_map]
+POLL_SECONDS = 30
+# With paging on, the problem list rotates a page of BLOCK_COUNT at a time
+# between polls instead of stopping at "and N more..."
+PAGE_SECONDS = secrets.get("display", {}).get("page_seconds", 0)
+PAGE_LIMIT = secrets.get("display", {}).get("page_limit", 5)
 
-display = board.DISPLAY
+KEEP = BLOCK_COUNT * PAGE_LIMIT if PAGE_SECONDS else BLOCK_COUNT
 
-root = displayio.Group(max_size=15)
-display.show(root)
-
-blocks = []
-BLOCK_BULLET = 0
-BLOCK_TOP = 1
-BLOCK_BOTTOM = 2
-for i in range(10):
-    block = displayio.Group(max_size=5, x=0, y=31 * i)
-    blocks.append(block)
-
-    bullet = Rect(0, 0, 10, 26, fill=WHITE)
-    block.append(bullet)
-
-    top_label = displayio.TileGrid(tiles, pixel_shader=palette_white, x=14, y=0, width=66, height=1, tile_width=TILE_WIDTH, tile_height=TILE_HEIGHT)
-    block.append(top_label)
-
-    bottom_label = displayio.TileGrid(tiles, pixel_shader=palette_grey, x=14, y=13, width=66, height=1, tile_width=TILE_WIDTH, tile_height=TILE_HEIGHT)
-    block.append(bottom_label)
-
-andthen = displayio.Group(max_size=10, x=0, y=307)
-root.append(andthen)
-
-andthen_label = displayio.TileGrid(tiles, pixel_shader=palette_white, x=14, y=0, width=66, height=1, tile_width=TILE_WIDTH, tile_height=TILE_HEIGHT)
-andthen.append(andthen_label)
-
-headers = {
-    "Authorization": "Basic " + secrets["api"]["credentials"]
-}
-services_url = "https://" + secrets["api"]["host"] + "/v1/objects/services?filter=service.state!=0%26%26service.state_type==1&attrs=state&attrs=last_hard_state_change"
-hosts_url = "https://" + secrets["api"]["host"] + "/v1/objects/hosts?filter=host.state!=0%26%26host.state_type==1&attrs=state&attrs=last_hard_state_change"
-
-services_cached = ""
-hosts_cached = ""
-while True:
-    services_response = wifi.requests.get(services_url, headers=headers)
-    services_text = services_response.text
-    services_response.close()
-
-    hosts_response = wifi.requests.get(hosts_url, headers=headers)
-    hosts_text = hosts_response.text
-    hosts_response.close()
-
-    if services_cached != services_text or hosts_cached != hosts_text:
-        services_cached = services_text
-        hosts_cached = hosts_text
-
-        clear()
-
-        if services_response.status_code == 200 and hosts_response.status_code == 200:
-            services_data = json.loads(services_text)
-            hosts_data = json.loads(hosts_text)
-            
-            items = services_data["results"] + hosts_data["results"]
-            item_count = len(items)
-
-            items.sort(key=item_key)
-            
-            i = 0
-            for block in blocks:
-                if item_count > i:
-                    item = items[i]
-                    item_type = item["type"]                    
-                    attrs = item["attrs"]
-                    state = int(attrs["state"])
-                    last_hard_state_change = int(attrs["last_hard_state_change"])
-
-                    if last_hard_state_change > 0:
-                        since = format_time(tzutil.US_Central.localtime(last_hard_state_change))
-                    else:
-                        since = "NEVER"
-
-                    if item_type == "Host":
-                        block[BLOCK_BULLET].fill = HOST_STATE_COLORS[state]
-                        top_text = "\1" + item["name"]
-                        bottom_text = HOST_STATE_LABELS[state] + " since " + since
-                    else:
-                        block[BLOCK_BULLET].fill = SERVICE_STATE_COLORS[state]
-                        bits = item["name"].split("!")
-                        top_text = "\1" + bits[1] + "\0 " + bits[0]
-                        bottom_text = SERVICE_STATE_LABELS[state] + " since " + since
-
-                    render_text(block[BLOCK_TOP], maps, top_text)
-                    render_text(block[BLOCK_BOTTOM], maps, bottom_text)
-
-                    if blocks[i] not in root:
-                        root.append(blocks[i])
-                else:
-                    if blocks[i] in root:
-                        root.remove(blocks[i])
+screen = Screen(keep=KEEP)
+display = board.DISPLAY
+display.show(screen.root)
+power = PowerManager(display, dim=secrets.get("display", {}).get("idle_brightness", 0.1))
+
+# The last known list goes up before wifi, marked stale until a poll
+# replaces it. Code can only write to CIRCUITPY once boot.py has run
+# storage.remount("/", readonly=False), which in turn leaves it read-only
+# to the computer; without that, point secrets["display"]["snapshot"] at
+# a writable filesystem, or set it to None to turn snapshots off.
+SNAPSHOT_FILE = secrets.get("display", {}).get("snapshot", "/snapshot.bin")
+snapshot = Snapshot(SNAPSHOT_FILE) if SNAPSHOT_FILE else None
+boot_top = TopK(KEEP)
+if snapshot is not None and snapshot.load(boot_top):
+    screen.draw_items(boot_top)
+    screen.draw_status("STALE: last known, connecting...")
+else:
+    boot_top = None
 
-                i += 1
-            
-            if item_count == 0:
-                render_text(andthen_label, maps, "Nothing to report")
-            else:
-                diff = item_count - len(blocks)
-                diff_text = "" if (diff <= 0) else "and " + str(diff) + " more..."
-                render_text(andthen_label, maps, diff_text)
-        else:
-            error = services_text if services_response.status_code != 200 else hosts_text
-            render_text(andthen_label, maps, "ERROR: " + error)    
+print("Connecting to wifi")
 
-    gc.collect()
+wifi = adafruit_pyportal.wifi.WiFi(status_neopixel=board.NEOPIXEL)
+wifi.connect(secrets["wifi"]["ssid"], secrets["wifi"]["password"])
 
-    time.sleep(30)
\ No newline at end of file
+def make_client(api):
+    return icinga.IcingaClient(wifi.requests, api["host"], api["credentials"], api.get("scheme", "https"),
+        exclude_acknowledged=api.get("exclude_acknowledged", False), exclude_downtimed=api.get("exclude_downtimed", False))
+
+# secrets["gateway"] = {"url": ...} makes this a thin panel drawing frames
+# rendered by gateway.py, which polls the API on behalf of every panel
+GATEWAY = secrets.get("gateway")
+
+# secrets["apis"] lists several masters to merge onto one panel, each with
+# an optional "interval" in seconds; otherwise secrets["api"] is the only one.
+# "mode" and "queue" are read from the first.
+if GATEWAY is None:
+    apis = secrets.get("apis") or [secrets["api"]]
+    aggregator = icinga.Aggregator([icinga.Endpoint(make_client(api), api.get("interval", POLL_SECONDS), KEEP) for api in apis])
+    client = aggregator.endpoints[0].client
+
+telemetry = Telemetry()
+# Touch scanning keeps the board out of light sleep; turn it off to save
+# power on panels nobody taps
+TOUCH = secrets.get("display", {}).get("touch", True)
+# Shows the cycle's telemetry on the bottom row instead of its usual text
+DEBUG_OVERLAY = secrets.get("display", {}).get("debug", False)
+
+def draw(top, page=0, error=None):
+    start = telemetry.start()
+    cells = 0
+    if top is not None:
+        cells += screen.draw_items(top, page)
+    if error is not None:
+        cells += screen.draw_error(error)
+    telemetry.stop("render", start)
+    telemetry.add("cells", cells)
+
+def finish_cycle():
+    telemetry.collect()
+    telemetry.add("duty", power.duty_cycle())
+    if DEBUG_OVERLAY:
+        screen.draw_status(telemetry.overlay())
+    telemetry.emit()
+
+def reconnect():
+    # Fetch failures are often the radio dropping off the network
+    try:
+        if not wifi.esp.is_connected:
+            print("Reconnecting to wifi")
+            wifi.connect(secrets["wifi"]["ssid"], secrets["wifi"]["password"])
+    except (OSError, RuntimeError) as e:
+        print("Wifi reconnect failed:", e)
+
+def events_session():
+    # A session of its own for the event stream, on a second ESP32 socket,
+    # built the way adafruit_requests.set_socket builds the default one
+    import adafruit_esp32spi.adafruit_esp32spi_socket as socket
+    return requests.Session(socket, requests._FakeSSLContext(wifi.esp))
+
+def stream():
+    # Subscribe, take a full snapshot, then follow state changes from the
+    # event stream. Events raised during the snapshot wait on the open
+    # stream and are applied after it. Any failure or end of stream starts
+    # over with a fresh subscription and snapshot.
+    queue = apis[0].get("queue", "monitor")
+    client.events_session = events_session()
+    top = TopK(BLOCK_COUNT)
+    while True:
+        problems = ProblemSet(apis[0].get("exclude_acknowledged", False), apis[0].get("exclude_downtimed", False))
+        telemetry.begin()
+        response = None
+        try:
+            response = client.subscribe(queue)
+            error = client.fetch(problems.add)
+        except icinga.FETCH_ERRORS as e:
+            error = str(e)
+        telemetry.add("fetch", client.wait_ns() // 1000000)
+        telemetry.add("parse", (client.fetch_ns() - client.wait_ns()) // 1000000)
+        telemetry.add("bytes", client.bytes_received())
+        if error is not None:
+            if response is not None:
+                response.close()
+            draw(None, error=error)
+            power.update(time.monotonic(), True, True)
+            finish_cycle()
+            reconnect()
+            power.sleep(aggregator.endpoints[0].scheduler.failure(0))
+            continue
+        aggregator.endpoints[0].scheduler.failures = 0
+
+        start = telemetry.start()
+        problems.fill(top)
+        telemetry.stop("sort", start)
+        draw(top)
+        power.update(time.monotonic(), top.count > 0, True)
+        if snapshot is not None:
+            snapshot.save(top, time.monotonic())
+        finish_cycle()
+
+        try:
+            for event in client.read_events(response):
+                if problems.apply(event):
+                    telemetry.begin()
+                    start = telemetry.start()
+                    problems.fill(top)
+                    telemetry.stop("sort", start)
+                    draw(top)
+                    power.update(time.monotonic(), top.count > 0, True)
+                    if snapshot is not None:
+                        snapshot.save(top, time.monotonic())
+                    finish_cycle()
+                else:
+                    # Check results keep arriving while nothing changes,
+                    # which lets the backlight dim on a quiet panel
+                    power.update(time.monotonic(), top.count > 0, False)
+        except icinga.FETCH_ERRORS as e:
+            print("Event stream failed:", e)
+            reconnect()
+            power.sleep(aggregator.endpoints[0].scheduler.failure(0))
+
+def poll():
+    # Cooperative tasks need asyncio, which is CircuitPython 7.1 and later
+    try:
+        import asyncio
+    except ImportError:
+        poll_sync()
+        return
+    from app import App
+
+    touch = None
+    if TOUCH:
+        import adafruit_touchscreen
+        touch = adafruit_touchscreen.Touchscreen(board.TOUCH_XL, board.TOUCH_XR, board.TOUCH_YD, board.TOUCH_YU,
+            calibration=((5200, 59000), (5800, 57000)), size=(display.width, display.height))
+    app = App(screen, aggregator, power, telemetry, KEEP, PAGE_SECONDS, touch, reconnect, DEBUG_OVERLAY, boot_top, snapshot)
+    asyncio.run(app.run())
+
+def poll_sync():
+    # Poll mode without asyncio: no touch, and pages only turn between polls
+    top = boot_top if boot_top is not None else TopK(KEEP)
+    stale = boot_top is not None
+    page = 0
+    next_page = None
+    while True:
+        now = time.monotonic()
+        telemetry.begin()
+        changed = aggregator.poll(now)
+        for endpoint in aggregator.polled:
+            c = endpoint.client
+            telemetry.add("fetch", c.wait_ns() // 1000000)
+            telemetry.add("parse", (c.fetch_ns() - c.wait_ns()) // 1000000)
+            telemetry.add("bytes", c.bytes_received())
+        errors = aggregator.errors()
+        if aggregator.polled and errors:
+            reconnect()
+
+        redraw = False
+        if stale and len(errors) == len(aggregator.endpoints):
+            # Keep the snapshot up until something newer arrives
+            if changed:
+                draw(None, error=errors[0])
+            changed = False
+        elif changed:
+            stale = False
+            start = telemetry.start()
+            aggregator.merge(top)
+            telemetry.stop("sort", start)
+            page = 0
+            redraw = True
+            next_page = now + PAGE_SECONDS if PAGE_SECONDS and screen.page_count(top) > 1 else None
+        elif next_page is not None and now >= next_page:
+            # Pages come from the items already kept, no fetching needed
+            page = (page + 1) % screen.page_count(top)
+            redraw = True
+            next_page = now + PAGE_SECONDS
+
+        if redraw:
+            draw(top, page, errors[0] if errors else None)
+        if snapshot is not None and not errors:
+            snapshot.save(top, now)
+
+        wake = aggregator.next_poll()
+        if aggregator.polled or redraw:
+            power.update(now, top.count > 0 or bool(errors), changed)
+            telemetry.add("next", int(wake - now))
+            telemetry.add("failures", aggregator.failures())
+            finish_cycle()
+
+        if next_page is not None:
+            wake = min(wake, next_page)
+        delay = wake - time.monotonic()
+        if delay > 0:
+            power.sleep(delay)
+
+def gateway():
+    # Only frames that changed are sent, and only rows that changed drawn
+    url = GATEWAY["url"]
+    interval = GATEWAY.get("interval", 5)
+    scheduler = PollScheduler(interval, fast_interval=interval, slow_interval=interval)
+    etag = None
+    tiles = None
+    # The glyph cache generation the gateway's tiles were copied in at
+    generation = None
+    page = 0
+    pages = 1
+    visible = 0
+    next_page = time.monotonic() + PAGE_SECONDS
+    while True:
+        now = time.monotonic()
+        if PAGE_SECONDS and now >= next_page:
+            if pages > 1:
+                page = (page + 1) % pages
+            next_page = now + PAGE_SECONDS
+
+        if tiles is not None and screen.glyph_cache.generation != generation:
+            # A local error or status line evicted tiles the frames use
+            tiles = None
+            etag = None
+
+        telemetry.begin()
+        frame = None
+        try:
+            start = telemetry.start()
+            headers = {"If-None-Match": etag} if etag else {}
+            response = wifi.requests.get(url + "/frame?page=" + str(page), headers=headers)
+            try:
+                if response.status_code == 200:
+                    frame = response.content
+                    etag = response.headers.get("etag")
+                elif response.status_code != 304:
+                    raise RuntimeError("Gateway returned " + str(response.status_code))
+            finally:
+                response.close()
+
+            if frame is not None:
+                visible, page, pages, version = frames.frame_header(frame)
+                if version != tiles:
+                    response = wifi.requests.get(url + "/tiles")
+                    try:
+                        tiles = frames.apply_tiles(response.content, screen.glyph_cache)
+                        generation = screen.glyph_cache.generation
+                    finally:
+                        response.close()
+            telemetry.stop("fetch", start)
+
+            if frame is not None and version != tiles:
+                # The gateway's tiles moved on meanwhile; fetch both again
+                etag = None
+                wake = now
+            else:
+                if frame is not None:
+                    start = telemetry.start()
+                    telemetry.add("cells", screen.draw_frame(frame))
+                    telemetry.stop("render", start)
+                    telemetry.add("bytes", len(frame))
+                power.update(now, visible > 0, frame is not None)
+                wake = scheduler.success(now, frame is not None, True)
+        except icinga.FETCH_ERRORS as e:
+            etag = None
+            screen.draw_error(str(e))
+            reconnect()
+            wake = scheduler.failure(now)
+        telemetry.add("failures", scheduler.failures)
+        finish_cycle()
+
+        if PAGE_SECONDS:
+            wake = min(wake, next_page)
+        delay = wake - time.monotonic()
+        if delay > 0:
+            power.sleep(delay)
+
+if GATEWAY is not None:
+    gateway()
+elif apis[0].get("mode", "poll") == "events":
+    stream()
+else:
+    poll()
@@ -0,0 +1,55 @@
+import time
+
+try:
+    import alarm
+except ImportError:
+    alarm = None
+
+class PowerManager:
+    """Dims the backlight once the problem list has been empty for
+    idle_after seconds and restores it on any change. Waits between polls
+    use light sleep where the runtime supports it. Active and idle time
+    are tracked for the duty cycle."""
+
+    def __init__(self, display, full=1.0, dim=0.1, idle_after=120):
+        self.display = display
+        self.full = full
+        self.dim = dim
+        self.idle_after = idle_after
+
+        self.brightness = None
+        self.quiet_since = None
+        self.started = time.monotonic()
+        self.idle = 0
+
+        self.set_brightness(full)
+
+    def set_brightness(self, brightness):
+        # Only touch the backlight when the level actually changes
+        if brightness != self.brightness:
+            self.brightness = brightness
+            self.display.brightness = brightness
+
+    def update(self, now, has_problems, changed):
+        if has_problems or changed:
+            self.quiet_since = None if has_problems else now
+            self.set_brightness(self.full)
+        elif self.quiet_since is None:
+            self.quiet_since = now
+        elif now - self.quiet_since >= self.idle_after:
+            self.set_brightness(self.dim)
+
+    def sleep(self, seconds):
+        start = time.monotonic()
+        if alarm is not None:
+            alarm.light_sleep_until_alarms(alarm.time.TimeAlarm(monotonic_time=start + seconds))
+        else:
+            time.sleep(seconds)
+        self.idle += time.monotonic() - start
+
+    def duty_cycle(self):
+        """Percentage of time spent awake since start."""
+        total = time.monotonic() - self.started
+        if total <= 0:
+            return 100
+        return int(100 * (total - self.idle) / total)
@@ -0,0 +1,196 @@
+import array
+import time
+
+# Hosts sort before services; within each, by state severity
+HOST_RANKS = (9, 0, 1) # up, down, unreachable
+SERVICE_RANKS = (19, 12, 10, 11) # ok, warning, critical, unknown
+
+def sort_key(item):
+    """Sorts worst first: hosts before services, then by state severity,
+    then most recent hard state change first."""
+    item_type, name, state, last_hard_state_change = item
+    if item_type == "Host":
+        rank = HOST_RANKS[state] if state < len(HOST_RANKS) else 9
+    else:
+        rank = SERVICE_RANKS[state] if state < len(SERVICE_RANKS) else 19
+    return (rank, -last_hard_state_change)
+
+HOST = 0
+SERVICE = 1
+
+class ItemStore:
+    """Fixed number of item records held in parallel columns. Service
+    names are split into host and service once, and repeated strings are
+    shared between records and across fills."""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.types = bytearray(capacity)
+        self.states = bytearray(capacity)
+        self.times = array.array("l", [0] * capacity)
+        self.hosts = [None] * capacity
+        self.services = [None] * capacity
+        self.strings = {}
+
+    def intern(self, s):
+        interned = self.strings.get(s)
+        if interned is None:
+            if len(self.strings) >= 4 * self.capacity:
+                self.strings.clear()
+            self.strings[s] = s
+            interned = s
+        return interned
+
+    def get(self, slot):
+        if self.types[slot] == HOST:
+            return ("Host", self.hosts[slot], self.states[slot], self.times[slot])
+        return ("Service", self.hosts[slot] + "!" + self.services[slot], self.states[slot], self.times[slot])
+
+    def set(self, slot, item):
+        item_type, name, state, last_hard_state_change = item
+        self.states[slot] = state
+        self.times[slot] = last_hard_state_change
+        if item_type == "Host":
+            self.types[slot] = HOST
+            self.hosts[slot] = self.intern(name)
+            self.services[slot] = None
+        else:
+            self.types[slot] = SERVICE
+            bang = name.find("!")
+            if bang < 0:
+                bang = len(name)
+            self.hosts[slot] = self.intern(name[:bang])
+            self.services[slot] = self.intern(name[bang + 1:])
+
+class TopK:
+    """Keeps the first size items in sort_key order out of everything
+    added, plus a count of all items. Items with equal keys stay in the
+    order they were added. Kept items live in an ItemStore; slots lists
+    their store slots in order.
+
+    digest is an order-independent hash of every item added, so two
+    fetches of the same problems compare equal without keeping either."""
+
+    def __init__(self, size):
+        self.size = size
+        self.store = ItemStore(size + 1)
+        self.keys = []
+        self.slots = []
+        self.free = list(range(size, -1, -1))
+        self.count = 0
+        self.digest = 0
+
+    def reset(self):
+        # Reused across polls so the store and lists are allocated once
+        self.free.extend(self.slots)
+        del self.keys[:]
+        del self.slots[:]
+        self.count = 0
+        self.digest = 0
+
+    def add(self, item):
+        self.count += 1
+        # Masked to stay a small int on the board
+        self.digest = (self.digest + hash(item)) & 0x3FFFFFFF
+        self._insert(item)
+
+    def merge(self, other):
+        """Adds everything another TopK was given: its kept items, plus its
+        count and digest."""
+        store = other.store
+        for slot in other.slots:
+            self._insert(store.get(slot))
+        self.count += other.count
+        self.digest = (self.digest + other.digest) & 0x3FFFFFFF
+
+    def _insert(self, item):
+        key = sort_key(item)
+        keys = self.keys
+        if len(keys) == self.size and not key < keys[-1]:
+            return
+
+        lo = 0
+        hi = len(keys)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if key < keys[mid]:
+                hi = mid
+            else:
+                lo = mid + 1
+        slot = self.free.pop()
+        self.store.set(slot, item)
+        keys.insert(lo, key)
+        self.slots.insert(lo, slot)
+        if len(keys) > self.size:
+            keys.pop()
+            self.free.append(self.slots.pop())
+
+    def overflow(self):
+        return self.count - len(self.slots)
+
+class ProblemSet:
+    """The current non-OK hard states, keyed by (type, name). Filled from
+    an objects query snapshot and kept current from event stream updates.
+
+    With exclude_acknowledged or exclude_downtimed, as given to the
+    IcingaClient that took the snapshot, events for acknowledged or
+    downtimed objects remove them like a recovery would."""
+
+    def __init__(self, exclude_acknowledged=False, exclude_downtimed=False):
+        self.items = {}
+        self.exclude_acknowledged = exclude_acknowledged
+        self.exclude_downtimed = exclude_downtimed
+
+    def add(self, item):
+        item_type, name, state, last_hard_state_change = item
+        self.items[(item_type, name)] = (state, last_hard_state_change)
+
+    def apply(self, event):
+        """Applies a StateChange or CheckResult event. Returns True if an
+        item entered, left or changed state."""
+        event_type = event.get("type")
+        service = event.get("service")
+        if event_type == "StateChange":
+            state = event.get("state")
+            state_type = event.get("state_type")
+        elif event_type == "CheckResult":
+            vars_after = event["check_result"].get("vars_after") or {}
+            state = vars_after.get("state")
+            state_type = vars_after.get("state_type")
+            if state is not None and not service:
+                # Host check results carry the raw service-style state
+                state = 0 if int(state) <= 1 else 1
+        else:
+            return False
+
+        # Only hard states are shown
+        if state is None or state_type is None or int(state_type) != 1:
+            return False
+        state = int(state)
+        # Both event types carry these since Icinga2 2.11
+        if self.exclude_acknowledged and event.get("acknowledgement"):
+            state = 0
+        if self.exclude_downtimed and event.get("downtime_depth"):
+            state = 0
+
+        if service:
+            key = ("Service", event["host"] + "!" + service)
+        else:
+            key = ("Host", event["host"])
+
+        current = self.items.get(key)
+        if state == 0:
+            if current is None:
+                return False
+            del self.items[key]
+            return True
+
+        if current is not None and current[0] == state:
+            return False
+        self.items[key] = (state, int(event.get("timestamp", time.time())))
+        return True
+
+    def fill(self, top):
+        top.reset()
+        for key, value in self.items.items():
+            top.add((key[0], key[1], value[0], value[1]))
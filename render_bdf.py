@@ -1,107 +1,214 @@
 import gc
-import displayio
+import os
+import struct
 
-def render_bdf(filename, code_points, bmp, tile_width, tile_height, tile_index):
-    metadata = True
-    character = False
-    code_point = None
-    bytes_per_row = 1
-    desired_character = False
-    current_info = {}
-    current_y = 0
-    rounded_x = 1
-    remaining = set(code_points)
-    bmp_width = bmp.width
-    bmp_height = bmp.height
+ATLAS_MAGIC = b"BDFA"
+ATLAS_VERSION = 1
+ATLAS_HEADER = "<4sBBBBH"
+ATLAS_ENTRY = "<HH"
 
-    map = {}
+INDEX_SUFFIX = ".idx"
+INDEX_MAGIC = b"BDFI"
+INDEX_VERSION = 1
+INDEX_HEADER = "<4sBxHL"
+INDEX_ENTRY = "<LL"
+INDEX_ENTRY_SIZE = 8
 
-    file = open(filename, "rb")
-    
+def _read_header(file):
     line = file.readline()
     line = str(line, "utf-8")
     if not line or not line.startswith("STARTFONT 2.1"):
         raise ValueError("Unsupported file version")
-    
-    file.seek(0)
+
+    bounds = None
+    while True:
+        line = file.readline()
+        if not line or line.startswith(b"CHARS "):
+            break
+        if line.startswith(b"FONTBOUNDINGBOX"):
+            _, width, height, x_offset, y_offset = line.split()
+            bounds = (int(width), int(height), int(x_offset), int(y_offset))
+
+    if bounds is None:
+        raise ValueError("Missing FONTBOUNDINGBOX")
+    return bounds
+
+def build_index(filename):
+    entries = []
+    offset = 0
+    start = 0
+
+    file = open(filename, "rb")
     while True:
         line = file.readline()
         if not line:
             break
-        if line.startswith(b"CHARS "):
-            metadata = False
-        elif line.startswith(b"SIZE"):
-            _, point_size, x_resolution, y_resolution = line.split()
-        elif line.startswith(b"COMMENT"):
-            pass
-        elif line.startswith(b"STARTCHAR"):
-            # print(lineno, line.strip())
-            # _, character_name = line.split()
-            character = True
-        elif line.startswith(b"ENDCHAR"):
-            character = False
-            if desired_character:
-                bounds = current_info["bounds"]
-                shift = current_info["shift"]
-                gc.collect()
-                map[code_point] = tile_index
-                remaining.remove(code_point)
-                tile_index += 1
-                if not remaining:
-                    break
-            desired_character = False
+        if line.startswith(b"STARTCHAR"):
+            start = offset
+        elif line.startswith(b"ENCODING"):
+            code_point = int(line.split()[1])
+            if code_point >= 0:
+                entries.append((code_point, start))
+        offset += len(line)
+    file.close()
+
+    entries.sort()
+    index = bytearray(len(entries) * INDEX_ENTRY_SIZE)
+    for i in range(len(entries)):
+        struct.pack_into(INDEX_ENTRY, index, i * INDEX_ENTRY_SIZE, *entries[i])
+    return index
+
+def load_index(filename):
+    """Returns the sorted (code point, STARTCHAR offset) table for a BDF font,
+    reading the cached sidecar file when it matches the font."""
+    font_size = os.stat(filename)[6]
+    index_filename = filename + INDEX_SUFFIX
+
+    try:
+        file = open(index_filename, "rb")
+        try:
+            header = file.read(struct.calcsize(INDEX_HEADER))
+            magic, version, count, size = struct.unpack(INDEX_HEADER, header)
+            if magic == INDEX_MAGIC and version == INDEX_VERSION and size == font_size:
+                index = file.read(count * INDEX_ENTRY_SIZE)
+                if len(index) == count * INDEX_ENTRY_SIZE:
+                    return index
+        finally:
+            file.close()
+    except (OSError, ValueError):
+        pass
+
+    index = build_index(filename)
+    save_index(filename, index, font_size)
+    return index
+
+def save_index(filename, index, font_size):
+    try:
+        file = open(filename + INDEX_SUFFIX, "wb")
+        file.write(struct.pack(INDEX_HEADER, INDEX_MAGIC, INDEX_VERSION, len(index) // INDEX_ENTRY_SIZE, font_size))
+        file.write(index)
+        file.close()
+    except OSError:
+        # Read-only filesystem; the index is rebuilt on the next start
+        pass
+
+def find_offset(index, code_point):
+    lo = 0
+    hi = len(index) // INDEX_ENTRY_SIZE
+    while lo < hi:
+        mid = (lo + hi) // 2
+        mid_code_point, offset = struct.unpack_from(INDEX_ENTRY, index, mid * INDEX_ENTRY_SIZE)
+        if mid_code_point == code_point:
+            return offset
+        if mid_code_point < code_point:
+            lo = mid + 1
+        else:
+            hi = mid
+    return None
+
+def render_glyph(file, bounds, bmp, tile_width, tile_height, tile_index):
+    """Renders the glyph record at the current file position into a tile,
+    overwriting every pixel of the tile."""
+    font_width, font_height, font_x, font_y = bounds
+    width = 0
+    left = 0
+    top = 0
+    rows = []
+    bitmap = False
+
+    while True:
+        line = file.readline()
+        if not line or line.startswith(b"ENDCHAR"):
+            break
+        if bitmap:
+            rows.append(int(line.strip(), 16))
         elif line.startswith(b"BBX"):
-            if desired_character:
-                _, x, y, x_offset, y_offset = line.split()
-                x = int(x)
-                y = int(y)
-                x_offset = int(x_offset)
-                y_offset = int(y_offset)
-                current_info["bounds"] = (x, y, x_offset, y_offset)
+            _, width, height, x_offset, y_offset = line.split()
+            width = int(width)
+            left = int(x_offset) - font_x
+            top = font_height + font_y - int(height) - int(y_offset)
         elif line.startswith(b"BITMAP"):
-            if desired_character:
-                rounded_x = x // 8
-                if x % 8 > 0:
-                    rounded_x += 1
-                bytes_per_row = rounded_x
-                if bytes_per_row % 4 > 0:
-                    bytes_per_row += 4 - bytes_per_row % 4
-                current_y = 0
-        elif line.startswith(b"ENCODING"):
-            _, code_point = line.split()
-            code_point = int(code_point)
-            if code_point in remaining:
-                desired_character = True
-                current_info = {"bounds": None, "shift": None}
-        elif line.startswith(b"DWIDTH"):
-            if desired_character:
-                _, shift_x, shift_y = line.split()
-                shift_x = int(shift_x)
-                shift_y = int(shift_y)
-                current_info["shift"] = (shift_x, shift_y)
-        elif line.startswith(b"SWIDTH"):
-            pass
-        elif character:
-            if desired_character:
-                bits = int(line.strip(), 16)
-                width = current_info["bounds"][0]
-                start = (current_y * bmp_width) + (tile_width * tile_index)
-                x = 0
-                for i in range(rounded_x):
-                    val = (bits >> ((rounded_x - i - 1) * 8)) & 0xFF
-                    for j in range(7, -1, -1):
-                        if x >= width:
-                            break
-                        bit = 0
-                        if val & (1 << j) != 0:
-                            bit = 1
-                        bmp[start + x] = bit
-                        x += 1
-                current_y += 1
-        elif metadata:
-            # print(lineno, line.strip())
-            pass
+            bitmap = True
+
+    row_bits = ((width + 7) // 8) * 8
+    row_count = len(rows)
+    bmp_width = bmp.width
+    start = tile_width * tile_index
+    for y in range(tile_height):
+        glyph_y = y - top
+        bits = rows[glyph_y] if 0 <= glyph_y < row_count else 0
+        for x in range(tile_width):
+            glyph_x = x - left
+            bit = 0
+            if bits and 0 <= glyph_x < width:
+                bit = (bits >> (row_bits - 1 - glyph_x)) & 1
+            bmp[start + x] = bit
+        start += bmp_width
+
+def open_font(filename):
+    index = load_index(filename)
+    gc.collect()
+    file = open(filename, "rb")
+    bounds = _read_header(file)
+    return file, bounds, index
+
+def render_bdf(filename, code_points, bmp, tile_width, tile_height, tile_index):
+    file, bounds, index = open_font(filename)
+
+    map = {}
+
+    for code_point in sorted(set(code_points)):
+        offset = find_offset(index, code_point)
+        if offset is None:
+            continue
+        file.seek(offset)
+        render_glyph(file, bounds, bmp, tile_width, tile_height, tile_index)
+        map[code_point] = tile_index
+        tile_index += 1
+
+    file.close()
+
+    return map
+
+def load_atlas(filename, bmp, tile_width, tile_height):
+    file = open(filename, "rb")
+
+    header = file.read(struct.calcsize(ATLAS_HEADER))
+    magic, version, atlas_width, atlas_height, font_count, tile_count = struct.unpack(ATLAS_HEADER, header)
+    if magic != ATLAS_MAGIC or version != ATLAS_VERSION:
+        file.close()
+        raise ValueError("Unsupported atlas version")
+    if atlas_width != tile_width or atlas_height != tile_height or tile_count * tile_width > bmp.width:
+        file.close()
+        raise ValueError("Atlas does not fit bitmap")
+
+    maps = []
+    entry_size = struct.calcsize(ATLAS_ENTRY)
+    for f in range(font_count):
+        count = struct.unpack("<H", file.read(2))[0]
+        entries = file.read(count * entry_size)
+        map = {}
+        for i in range(0, count * entry_size, entry_size):
+            code_point, tile_index = struct.unpack_from(ATLAS_ENTRY, entries, i)
+            map[code_point] = tile_index
+        maps.append(map)
+        gc.collect()
+
+    # Rows are packed MSB first across the whole atlas width. The bitmap
+    # starts out cleared, so only set bits need writing.
+    bmp_width = bmp.width
+    row = bytearray((tile_count * tile_width + 7) // 8)
+    for y in range(tile_height):
+        file.readinto(row)
+        start = y * bmp_width
+        for i in range(len(row)):
+            val = row[i]
+            if val:
+                x = start + i * 8
+                for j in range(8):
+                    if val & (0x80 >> j):
+                        bmp[x + j] = 1
 
     file.close()
 
-    return map
\ No newline at end of file
+    return maps
\ No newline at end of file
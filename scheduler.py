@@ -0,0 +1,38 @@
+import random
+
+class PollScheduler:
+    """Picks the delay before the next poll. Polls come quickly while the
+    problem list is changing, slow down step by step while it is stable,
+    and back off exponentially with jitter while polls fail."""
+
+    def __init__(self, interval, fast_interval=None, slow_interval=None, max_backoff=600, stable_step=1.5):
+        self.interval = interval
+        self.fast_interval = fast_interval if fast_interval is not None else min(interval, max(5, interval / 3))
+        self.slow_interval = slow_interval if slow_interval is not None else interval * 4
+        self.max_backoff = max_backoff
+        self.stable_step = stable_step
+
+        self.delay = interval
+        self.failures = 0
+        self.next_poll = 0
+
+    def success(self, now, changed, has_problems):
+        self.failures = 0
+        if changed and has_problems:
+            self.delay = self.fast_interval
+        elif changed:
+            self.delay = self.interval
+        else:
+            # Stable: stretch towards the slow interval, starting from the
+            # normal interval after a change or a failure
+            self.delay = min(self.slow_interval, max(self.interval, self.delay * self.stable_step))
+        self.next_poll = now + self.delay
+        return self.next_poll
+
+    def failure(self, now):
+        self.failures += 1
+        backoff = min(self.max_backoff, self.interval * (2 ** (self.failures - 1)))
+        # Jitter so panels that failed together don't retry together
+        self.delay = backoff * (0.5 + random.random() / 2)
+        self.next_poll = now + self.delay
+        return self.next_poll
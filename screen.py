@@ -0,0 +1,371 @@
+import struct
+import displayio
+import tzutil
+import frames
+from problems import HOST
+import render_bdf
+from glyph_cache import GlyphCache, LabelCache
+
+BLACK = 0x000000
+DGREY = 0x888888
+LGREY = 0xAAAAAA
+WHITE = 0xFFFFFF
+SERVICE_STATE_COLORS = [0x23BD7D, 0xFFA856, 0xFF4C68, 0xB33AF6]
+SERVICE_STATE_LABELS = ["OK", "WARNING", "CRITICAL", "UNKNOWN"]
+HOST_STATE_COLORS = [0x23BD7D, 0xFF4C68, 0xB33AF6]
+HOST_STATE_LABELS = ["UP", "DOWN", "UNREACHABLE"]
+
+# Every bullet colour, one solid tile each in the bullet sprite sheet
+BULLET_COLORS = [WHITE]
+for color in SERVICE_STATE_COLORS + HOST_STATE_COLORS:
+    if color not in BULLET_COLORS:
+        BULLET_COLORS.append(color)
+BULLET_WIDTH = 10
+BULLET_HEIGHT = 26
+
+TILE_COUNT = 160
+TILE_WIDTH = 7
+TILE_HEIGHT = 13
+ROW_WIDTH = 66
+BLOCK_COUNT = 10
+
+BLOCK_BULLET = 0
+BLOCK_TOP = 1
+BLOCK_BOTTOM = 2
+
+FONT_FILES = ["ctrld-fixed-13r.bdf", "ctrld-fixed-13b.bdf"]
+ATLAS_FILE = "ctrld-fixed-13.atlas"
+GLYPHS = b'0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ-,.:/! '
+
+def hour_to_12(h):
+    if h == 0:
+        return 12
+    if h > 12:
+        return h - 12
+    return h
+
+def hour_to_suffix(h):
+    if h < 12:
+        return "AM"
+    return "PM"
+
+def format_time(t):
+    return "{}-{:02d}-{:02d} {:02d}:{:02d}:{:02d} {}".format(
+        t.tm_year,
+        t.tm_mon,
+        t.tm_mday,
+        hour_to_12(t.tm_hour),
+        t.tm_min,
+        t.tm_sec,
+        hour_to_suffix(t.tm_hour),
+    )
+
+def format_since(last_hard_state_change):
+    if last_hard_state_change > 0:
+        return format_time(tzutil.US_Central.localtime(last_hard_state_change))
+    return "NEVER"
+
+def render_text(grid, cache, text, cells):
+    # cells mirrors the tile indices already in the grid, so only cells
+    # that change are written. Returns the number of cells written.
+    xs = ROW_WIDTH
+    ys = 1
+    ts = len(text)
+    i = 0
+    n = 0
+    map = 0
+    written = 0
+    for y in range(ys):
+        for x in range(xs):
+            tile = 0
+            if i < ts:
+                while True:
+                    c = ord(text[i])
+                    i += 1
+                    if c > 10:
+                        break
+                    map = c
+
+                tile = cache.lookup(map, c)
+
+            if cells[n] != tile:
+                cells[n] = tile
+                grid[x, y] = tile
+                written += 1
+            n += 1
+    return written
+
+def render_runs(grid, runs, cells):
+    # Fast path for text already encoded by a LabelCache: copies runs of
+    # tile indices into the row, writing only cells that change. Returns
+    # the number of cells written.
+    xs = ROW_WIDTH
+    n = 0
+    written = 0
+    for run in runs:
+        for tile in run:
+            if n >= xs:
+                break
+            if cells[n] != tile:
+                cells[n] = tile
+                grid[n, 0] = tile
+                written += 1
+            n += 1
+    while n < xs:
+        if cells[n] != 0:
+            cells[n] = 0
+            grid[n, 0] = 0
+            written += 1
+        n += 1
+    return written
+
+class Screen:
+    """The problem list display: BLOCK_COUNT blocks of a state bullet and
+    two text rows, plus the "and N more..." row at the bottom.
+
+    keep is the most items a TopK passed to draw_items holds; the text
+    caches are sized so that paging through all of them hits."""
+
+    def __init__(self, font_dir="/fonts", keep=BLOCK_COUNT):
+        self.palette_white = displayio.Palette(2)
+        self.palette_white[0] = BLACK
+        self.palette_white[1] = WHITE
+
+        self.palette_grey = displayio.Palette(2)
+        self.palette_grey[0] = BLACK
+        self.palette_grey[1] = LGREY
+
+        self.tiles = displayio.Bitmap(TILE_COUNT * TILE_WIDTH, TILE_HEIGHT, 2)
+
+        font_files = [font_dir + "/" + f for f in FONT_FILES]
+        try:
+            # Built offline by compile_bdf.py
+            maps = render_bdf.load_atlas(font_dir + "/" + ATLAS_FILE, self.tiles, TILE_WIDTH, TILE_HEIGHT)
+        except (OSError, ValueError) as e:
+            print("Atlas unavailable, parsing BDF:", e)
+            normal_map = render_bdf.render_bdf(font_files[0], GLYPHS, self.tiles, TILE_WIDTH, TILE_HEIGHT, 1)
+            bold_map = render_bdf.render_bdf(font_files[1], GLYPHS, self.tiles, TILE_WIDTH, TILE_HEIGHT, len(normal_map) + 1)
+            maps = [normal_map, bold_map]
+        self.glyph_cache = GlyphCache(self.tiles, TILE_WIDTH, TILE_HEIGHT, font_files, maps)
+        # A name, a service and a time per item, and the shared labels
+        self.label_cache = LabelCache(self.glyph_cache, 3 * keep + 32)
+        # Many items share a timestamp, and the same items are redrawn
+        # each cycle; cleared once it holds more than the kept items' worth
+        self.since_cache = {}
+        self.since_size = keep + BLOCK_COUNT
+
+        # Blocks share one sheet and palette, so a bullet changes colour by
+        # switching its tile index
+        self.bullet_palette = displayio.Palette(len(BULLET_COLORS))
+        self.bullet_tiles = {}
+        for i in range(len(BULLET_COLORS)):
+            self.bullet_palette[i] = BULLET_COLORS[i]
+            self.bullet_tiles[BULLET_COLORS[i]] = i
+        self.bullets = displayio.Bitmap(len(BULLET_COLORS) * BULLET_WIDTH, BULLET_HEIGHT, len(BULLET_COLORS))
+        for x in range(self.bullets.width):
+            for y in range(BULLET_HEIGHT):
+                self.bullets[x, y] = x // BULLET_WIDTH
+
+        self.root = displayio.Group(max_size=15)
+
+        self.blocks = []
+        self.block_cells = []
+        self.block_fills = []
+        # Identity and (state, time) of the item each block shows
+        self.block_keys = [None] * BLOCK_COUNT
+        self.block_values = [None] * BLOCK_COUNT
+        for i in range(BLOCK_COUNT):
+            block = displayio.Group(max_size=5, x=0, y=31 * i)
+            self.blocks.append(block)
+            self.block_cells.append((bytearray(ROW_WIDTH), bytearray(ROW_WIDTH)))
+            self.block_fills.append(WHITE)
+
+            bullet = displayio.TileGrid(self.bullets, pixel_shader=self.bullet_palette, width=1, height=1,
+                tile_width=BULLET_WIDTH, tile_height=BULLET_HEIGHT, default_tile=self.bullet_tiles[WHITE])
+            block.append(bullet)
+
+            block.append(self.label(self.palette_white, 14, 0))
+            block.append(self.label(self.palette_grey, 14, 13))
+
+        self.andthen = displayio.Group(max_size=10, x=0, y=307)
+        self.root.append(self.andthen)
+
+        self.andthen_label = self.label(self.palette_white, 14, 0)
+        self.andthen.append(self.andthen_label)
+        self.andthen_cells = bytearray(ROW_WIDTH)
+
+    def since(self, last_hard_state_change):
+        since_cache = self.since_cache
+        since = since_cache.get(last_hard_state_change)
+        if since is None:
+            if len(since_cache) >= self.since_size:
+                since_cache.clear()
+            since = format_since(last_hard_state_change)
+            since_cache[last_hard_state_change] = since
+        return since
+
+    def label(self, palette, x, y):
+        return displayio.TileGrid(self.tiles, pixel_shader=palette, x=x, y=y, width=ROW_WIDTH, height=1, tile_width=TILE_WIDTH, tile_height=TILE_HEIGHT)
+
+    def page_count(self, top):
+        return max(1, (len(top.slots) + BLOCK_COUNT - 1) // BLOCK_COUNT)
+
+    def draw_items(self, top, page=0):
+        """Draws one page of the items kept by a problems.TopK. Returns the
+        number of text cells written.
+
+        Blocks track the identity of the item they show. An item still in
+        the same block is skipped, and one that moved has its tile indices
+        copied from the block it was in, so only new or changed items are
+        encoded."""
+        glyph_cache = self.glyph_cache
+        glyph_cache.begin_frame()
+        written = 0
+
+        encode = self.label_cache.encode
+        store = top.store
+        slots = top.slots
+        first = page * BLOCK_COUNT
+        visible = max(0, min(BLOCK_COUNT, len(slots) - first))
+        root = self.root
+        blocks = self.blocks
+        keys = self.block_keys
+        values = self.block_values
+
+        wanted = []
+        for p in range(visible):
+            slot = slots[first + p]
+            wanted.append((store.types[slot], store.hosts[slot], store.services[slot]))
+
+        # Copy out the rows of items that moved before any block is
+        # overwritten, and keep their tiles from being evicted meanwhile
+        moved = {}
+        for b in range(BLOCK_COUNT):
+            key = keys[b]
+            if key is not None and (b >= visible or wanted[b] != key) and key in wanted:
+                top_cells, bottom_cells = self.block_cells[b]
+                glyph_cache.touch(top_cells)
+                glyph_cache.touch(bottom_cells)
+                moved[key] = (bytes(top_cells), bytes(bottom_cells), values[b])
+
+        for b in range(visible):
+            block = blocks[b]
+            slot = slots[first + b]
+            top_cells, bottom_cells = self.block_cells[b]
+            key = wanted[b]
+            state = store.states[slot]
+            value = (state, store.times[slot])
+            previous = moved.get(key)
+            # A new item needs its bottom row and bullet drawn even when its
+            # state and time match the old one's; they may be another type
+            same = keys[b] == key
+
+            if same:
+                # Unchanged text still has to keep its tiles out of eviction
+                glyph_cache.touch(top_cells)
+            else:
+                if previous is not None:
+                    top_runs = (previous[0],)
+                elif key[0] == HOST:
+                    top_runs = (encode(1, key[1]),)
+                else:
+                    top_runs = (encode(1, key[2]), encode(0, " "), encode(0, key[1]))
+                written += render_runs(block[BLOCK_TOP], top_runs, top_cells)
+                keys[b] = key
+
+            if same and values[b] == value:
+                glyph_cache.touch(bottom_cells)
+            else:
+                if key[0] == HOST:
+                    fill = HOST_STATE_COLORS[state]
+                    label = HOST_STATE_LABELS[state]
+                else:
+                    fill = SERVICE_STATE_COLORS[state]
+                    label = SERVICE_STATE_LABELS[state]
+
+                if self.block_fills[b] != fill:
+                    self.block_fills[b] = fill
+                    block[BLOCK_BULLET][0] = self.bullet_tiles[fill]
+
+                if previous is not None and previous[2] == value:
+                    bottom_runs = (previous[1],)
+                else:
+                    bottom_runs = (encode(0, label + " since "), encode(0, self.since(value[1])))
+                written += render_runs(block[BLOCK_BOTTOM], bottom_runs, bottom_cells)
+                values[b] = value
+
+            if block not in root:
+                root.append(block)
+
+        for b in range(visible, BLOCK_COUNT):
+            if blocks[b] in root:
+                root.remove(blocks[b])
+            # Nothing touches a hidden block's tiles, so they may be evicted
+            # and reused before it shows again
+            keys[b] = None
+            values[b] = None
+
+        pages = self.page_count(top)
+        diff = top.overflow()
+        diff_text = "" if (diff <= 0) else "and " + str(diff) + " more..."
+        if top.count == 0:
+            diff_text = "Nothing to report"
+        elif pages > 1:
+            diff_text = "page " + str(page + 1) + "/" + str(pages) + " " + diff_text
+        written += render_runs(self.andthen_label, (encode(0, diff_text),), self.andthen_cells)
+
+        return written
+
+    def draw_frame(self, frame):
+        """Draws a frame rendered by gateway.py; see frames.py. Its tile
+        indices must refer to the tiles last applied with
+        frames.apply_tiles. Only rows that differ are written. Returns the
+        number of text cells written."""
+        visible, page, pages, tiles = frames.frame_header(frame)
+        offset = struct.calcsize(frames.FRAME_HEADER)
+        fill_size = struct.calcsize(frames.FRAME_FILL)
+        if visible > BLOCK_COUNT or len(frame) != offset + visible * (fill_size + 2 * ROW_WIDTH) + ROW_WIDTH:
+            raise ValueError("Bad frame length")
+        glyph_cache = self.glyph_cache
+        glyph_cache.begin_frame()
+        written = 0
+
+        root = self.root
+        for b in range(visible):
+            block = self.blocks[b]
+            fill = struct.unpack_from(frames.FRAME_FILL, frame, offset)[0]
+            offset += fill_size
+            if self.block_fills[b] != fill:
+                self.block_fills[b] = fill
+                # A colour this build has no tile for shows as white
+                block[BLOCK_BULLET][0] = self.bullet_tiles.get(fill, 0)
+
+            for row, cells in ((BLOCK_TOP, self.block_cells[b][0]), (BLOCK_BOTTOM, self.block_cells[b][1])):
+                line = frame[offset:offset + ROW_WIDTH]
+                offset += ROW_WIDTH
+                if cells != line:
+                    written += render_runs(block[row], (line,), cells)
+                glyph_cache.touch(cells)
+
+            # The gateway tracks item identity, not this screen
+            self.block_keys[b] = None
+            self.block_values[b] = None
+            if block not in root:
+                root.append(block)
+
+        for b in range(visible, BLOCK_COUNT):
+            if self.blocks[b] in root:
+                root.remove(self.blocks[b])
+
+        line = frame[offset:offset + ROW_WIDTH]
+        if self.andthen_cells != line:
+            written += render_runs(self.andthen_label, (line,), self.andthen_cells)
+        glyph_cache.touch(self.andthen_cells)
+        return written
+
+    def draw_status(self, text):
+        # Drawn over the bottom row of the current frame, so no begin_frame
+        return render_text(self.andthen_label, self.glyph_cache, text, self.andthen_cells)
+
+    def draw_error(self, error):
+        return self.draw_status("ERROR: " + error)
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# Responsiveness harness for the asyncio main loop in app.py, run under
+# desktop Python against the sim_displayio stand-ins and a fake API whose
+# responses trickle in one chunk at a time.
+#
+# Taps arrive at random while polls are in flight; for each one the time
+# until its page is redrawn is reported, along with the longest stretch
+# the loop went without scheduling the touch task.
+#
+#   python3 sim_app.py --items 300 --chunk-ms 5 --seconds 10
+
+import argparse
+import asyncio
+import random
+import time
+
+import sim_displayio
+sim_displayio.install()
+
+import app
+import icinga
+from bench import synthetic_cycles
+from screen import Screen, BLOCK_COUNT
+from telemetry import Telemetry
+
+class FakeResponse:
+    def __init__(self, payload, chunk_seconds):
+        self.status_code = 200
+        self.payload = payload
+        self.chunk_seconds = chunk_seconds
+
+    def iter_content(self, chunk_size):
+        for i in range(0, len(self.payload), chunk_size):
+            # Blocks like a socket read on the board would
+            time.sleep(self.chunk_seconds)
+            yield self.payload[i:i + chunk_size]
+
+    def close(self):
+        pass
+
+class FakeSession:
+    def __init__(self, cycles, chunk_seconds):
+        self.cycles = cycles
+        self.chunk_seconds = chunk_seconds
+        self.requests = 0
+
+    def get(self, url, headers=None, stream=False, timeout=None):
+        services, hosts = self.cycles[(self.requests // 2) % len(self.cycles)]
+        self.requests += 1
+        payload = hosts if "/hosts" in url else services
+        return FakeResponse(payload, self.chunk_seconds)
+
+class FakeTouch:
+    """Reports a press from tap() until the page it turns is drawn, and
+    tracks the longest gap between scans."""
+
+    def __init__(self):
+        self.pressed_at = None
+        self.last_scan = None
+        self.max_gap = 0
+
+    def tap(self):
+        self.pressed_at = time.monotonic()
+
+    @property
+    def touch_point(self):
+        now = time.monotonic()
+        if self.last_scan is not None:
+            self.max_gap = max(self.max_gap, now - self.last_scan)
+        self.last_scan = now
+        if self.pressed_at is None:
+            return None
+        return (160, 240, 30000)
+
+class FakePower:
+    full = 1.0
+
+    def __init__(self):
+        self.brightness = 1.0
+
+    def update(self, now, has_problems, changed):
+        pass
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+    def duty_cycle(self):
+        return 100
+
+async def tapper(loop, touch, latencies, screen, seconds, rng):
+    draw_items = screen.draw_items
+
+    def timed_draw(top, page=0):
+        if touch.pressed_at is not None:
+            latencies.append(time.monotonic() - touch.pressed_at)
+            touch.pressed_at = None
+        return draw_items(top, page)
+    screen.draw_items = timed_draw
+
+    # Taps only turn pages once the first poll has filled some
+    while loop.screen.page_count(loop.top) < 2:
+        await asyncio.sleep(0.01)
+
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        await asyncio.sleep(rng.uniform(0.1, 0.5))
+        touch.tap()
+
+async def main_async(args):
+    rng = random.Random(args.seed)
+    cycles = synthetic_cycles(args.items, 4, args.seed)
+    session = FakeSession(cycles, args.chunk_ms / 1000)
+    client = icinga.IcingaClient(session, "sim", "user:pass")
+    # A short interval keeps a poll in flight for most of the run
+    aggregator = icinga.Aggregator([icinga.Endpoint(client, 1, BLOCK_COUNT * 5)])
+
+    screen = Screen(args.fonts, BLOCK_COUNT * 5)
+    touch = FakeTouch()
+    telemetry = Telemetry()
+    telemetry.emit = lambda: None
+    loop = app.App(screen, aggregator, FakePower(), telemetry, BLOCK_COUNT * 5, page_seconds=3, touch=touch)
+
+    latencies = []
+    runner = asyncio.create_task(loop.run())
+    await tapper(loop, touch, latencies, screen, args.seconds, rng)
+    runner.cancel()
+    try:
+        await runner
+    except asyncio.CancelledError:
+        pass
+    return latencies, touch, session, client
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure tap latency while slow polls are in flight")
+    parser.add_argument("--items", type=int, default=300, help="synthetic problem count")
+    parser.add_argument("--chunk-ms", type=float, default=5, help="delay per 512 byte chunk")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--fonts", default="fonts")
+    args = parser.parse_args()
+
+    latencies, touch, session, client = asyncio.run(main_async(args))
+
+    print("requests: {}, last fetch {:.0f} ms".format(session.requests, client.fetch_ns() / 1e6))
+    if latencies:
+        latencies.sort()
+        print("taps: {}, latency ms: median {:.1f}, max {:.1f}".format(len(latencies),
+            1000 * latencies[len(latencies) // 2], 1000 * latencies[-1]))
+    print("longest gap between touch scans: {:.1f} ms".format(1000 * touch.max_gap))
+
+if __name__ == "__main__":
+    main()
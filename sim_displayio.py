@@ -0,0 +1,209 @@
+# Desktop stand-in for the parts of displayio and adafruit_display_shapes
+# used by this project, so the rendering code can be run and profiled off
+# the board. Nothing is drawn; writes are counted in stats instead.
+#
+#   import sim_displayio
+#   sim_displayio.install()
+#   import screen
+
+import sys
+import types
+
+class Stats:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        # Pixels written into bitmaps
+        self.bitmap_writes = 0
+        # Tile index assignments that changed a TileGrid cell
+        self.tile_writes = 0
+        # Screen pixels the display would have to refresh
+        self.dirty_pixels = 0
+
+stats = Stats()
+
+class Bitmap:
+    def __init__(self, width, height, value_count):
+        self.width = width
+        self.height = height
+        self.value_count = value_count
+        self.pixels = bytearray(width * height)
+
+    def _index(self, index):
+        if isinstance(index, tuple):
+            return index[1] * self.width + index[0]
+        return index
+
+    def __getitem__(self, index):
+        return self.pixels[self._index(index)]
+
+    def __setitem__(self, index, value):
+        self.pixels[self._index(index)] = value
+        stats.bitmap_writes += 1
+
+    def fill(self, value):
+        for i in range(len(self.pixels)):
+            self.pixels[i] = value
+        stats.bitmap_writes += len(self.pixels)
+
+class Palette:
+    def __init__(self, color_count):
+        self.colors = [0] * color_count
+        self.transparent = set()
+
+    def __len__(self):
+        return len(self.colors)
+
+    def __getitem__(self, index):
+        return self.colors[index]
+
+    def __setitem__(self, index, color):
+        self.colors[index] = color
+
+    def make_transparent(self, index):
+        self.transparent.add(index)
+
+    def make_opaque(self, index):
+        self.transparent.discard(index)
+
+class TileGrid:
+    def __init__(self, bitmap, *, pixel_shader, x=0, y=0, width=1, height=1, tile_width=None, tile_height=None, default_tile=0):
+        self.bitmap = bitmap
+        self.pixel_shader = pixel_shader
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+        self.tile_width = tile_width if tile_width is not None else bitmap.width
+        self.tile_height = tile_height if tile_height is not None else bitmap.height
+        self.hidden = False
+        self.tiles = bytearray([default_tile] * (width * height))
+
+    def __getitem__(self, index):
+        if isinstance(index, tuple):
+            index = index[1] * self.width + index[0]
+        return self.tiles[index]
+
+    def __setitem__(self, index, tile):
+        if isinstance(index, tuple):
+            index = index[1] * self.width + index[0]
+        if self.tiles[index] != tile:
+            self.tiles[index] = tile
+            stats.tile_writes += 1
+            stats.dirty_pixels += self.tile_width * self.tile_height
+
+class Group:
+    def __init__(self, *, max_size=4, scale=1, x=0, y=0):
+        self.max_size = max_size
+        self.scale = scale
+        self._x = x
+        self._y = y
+        self.hidden = False
+        self._layers = []
+
+    def area(self):
+        area = 0
+        for layer in self._layers:
+            if isinstance(layer, Group):
+                area += layer.area()
+            else:
+                area += layer.width * layer.tile_width * layer.height * layer.tile_height
+        return area
+
+    def _moved(self):
+        # Both the old and the new position need refreshing
+        stats.dirty_pixels += 2 * self.area()
+
+    @property
+    def x(self):
+        return self._x
+
+    @x.setter
+    def x(self, x):
+        if x != self._x:
+            self._x = x
+            self._moved()
+
+    @property
+    def y(self):
+        return self._y
+
+    @y.setter
+    def y(self, y):
+        if y != self._y:
+            self._y = y
+            self._moved()
+
+    def append(self, layer):
+        if len(self._layers) >= self.max_size:
+            raise RuntimeError("Group full")
+        self._layers.append(layer)
+
+    def insert(self, index, layer):
+        if len(self._layers) >= self.max_size:
+            raise RuntimeError("Group full")
+        self._layers.insert(index, layer)
+
+    def remove(self, layer):
+        self._layers.remove(layer)
+
+    def pop(self, index=-1):
+        return self._layers.pop(index)
+
+    def index(self, layer):
+        return self._layers.index(layer)
+
+    def __contains__(self, layer):
+        return layer in self._layers
+
+    def __getitem__(self, index):
+        return self._layers[index]
+
+    def __setitem__(self, index, layer):
+        self._layers[index] = layer
+
+    def __delitem__(self, index):
+        del self._layers[index]
+
+    def __len__(self):
+        return len(self._layers)
+
+class Rect(TileGrid):
+    """Stand-in for adafruit_display_shapes.rect.Rect."""
+
+    def __init__(self, x, y, width, height, *, fill=None, outline=None, stroke=1):
+        self._palette = Palette(3)
+        self._palette[2] = fill if fill is not None else 0
+        self._palette[1] = outline if outline is not None else 0
+        super().__init__(Bitmap(width, height, 3), pixel_shader=self._palette, x=x, y=y)
+
+    @property
+    def fill(self):
+        return self._palette[2]
+
+    @fill.setter
+    def fill(self, color):
+        self._palette[2] = color
+        stats.dirty_pixels += self.bitmap.width * self.bitmap.height
+
+    @property
+    def outline(self):
+        return self._palette[1]
+
+    @outline.setter
+    def outline(self, color):
+        self._palette[1] = color
+        stats.dirty_pixels += self.bitmap.width * self.bitmap.height
+
+def install():
+    """Registers the stand-ins as displayio and
+    adafruit_display_shapes.rect. Call before importing screen."""
+    displayio = sys.modules[__name__]
+    shapes = types.ModuleType("adafruit_display_shapes")
+    rect = types.ModuleType("adafruit_display_shapes.rect")
+    rect.Rect = Rect
+    shapes.rect = rect
+    sys.modules["displayio"] = displayio
+    sys.modules["adafruit_display_shapes"] = shapes
+    sys.modules["adafruit_display_shapes.rect"] = rect
@@ -0,0 +1,100 @@
+import struct
+from problems import HOST
+
+SNAPSHOT_MAGIC = b"SNAP"
+SNAPSHOT_VERSION = 1
+# magic, version, kept items, count of all items, digest, body length
+SNAPSHOT_HEADER = "<4sBxHLLL"
+# type, state, last hard state change, host and service name lengths
+SNAPSHOT_ENTRY = "<BBlHH"
+
+class Snapshot:
+    """The last known problem list, kept in flash so the first frame after
+    power-up can be drawn before wifi and the first poll. The file holds
+    a problems.TopK's kept items in order, plus its count and digest.
+
+    Flash wears with every write, so a save only happens when the list
+    differs from what is already stored, and at most once per
+    min_interval seconds; a change inside the interval is written by a
+    later call. Files with another version are ignored rather than
+    parsed, so a format change only costs one stale first frame."""
+
+    def __init__(self, filename, min_interval=600):
+        self.filename = filename
+        self.min_interval = min_interval
+        self.saved_at = None
+        self.digest = None
+        self.writes = 0
+
+    def load(self, top):
+        """Fills top from the file. Returns False, leaving top empty, if
+        there is no usable snapshot."""
+        top.reset()
+        try:
+            with open(self.filename, "rb") as file:
+                data = file.read()
+            offset = struct.calcsize(SNAPSHOT_HEADER)
+            if len(data) < offset:
+                return False
+            magic, version, kept, count, digest, length = struct.unpack_from(SNAPSHOT_HEADER, data, 0)
+            if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+                return False
+            if len(data) != offset + length:
+                # Cut short by a reset during the write
+                return False
+
+            entry_size = struct.calcsize(SNAPSHOT_ENTRY)
+            for i in range(kept):
+                if offset + entry_size > len(data):
+                    top.reset()
+                    return False
+                item_type, state, last_hard_state_change, host_length, service_length = struct.unpack_from(SNAPSHOT_ENTRY, data, offset)
+                offset += entry_size
+                host = str(data[offset:offset + host_length], "utf-8")
+                offset += host_length
+                if item_type == HOST:
+                    top.add(("Host", host, state, last_hard_state_change))
+                else:
+                    service = str(data[offset:offset + service_length], "utf-8")
+                    top.add(("Service", host + "!" + service, state, last_hard_state_change))
+                offset += service_length
+        except (OSError, ValueError) as e:
+            print("Snapshot unavailable:", e)
+            top.reset()
+            return False
+
+        top.count = count
+        top.digest = digest
+        self.digest = (count, digest)
+        return True
+
+    def save(self, top, now):
+        """Writes top if it changed since the last write and the interval
+        has passed. Returns True if the file was written."""
+        digest = (top.count, top.digest)
+        if digest == self.digest:
+            return False
+        if self.saved_at is not None and now - self.saved_at < self.min_interval:
+            return False
+
+        store = top.store
+        body = bytearray()
+        for slot in top.slots:
+            host = store.hosts[slot].encode("utf-8")
+            service = b"" if store.types[slot] == HOST else store.services[slot].encode("utf-8")
+            body += struct.pack(SNAPSHOT_ENTRY, store.types[slot], store.states[slot], store.times[slot], len(host), len(service))
+            body += host
+            body += service
+
+        # Counts as an attempt even if it fails, so a read-only filesystem
+        # is only tried once per interval
+        self.saved_at = now
+        try:
+            with open(self.filename, "wb") as file:
+                file.write(struct.pack(SNAPSHOT_HEADER, SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(top.slots), top.count, top.digest, len(body)))
+                file.write(body)
+        except OSError:
+            return False
+        self.digest = digest
+        self.writes += 1
+        return True
@@ -0,0 +1,46 @@
+import gc
+import time
+
+class Telemetry:
+    """Per-cycle timings and counters, written to serial as one
+    "T key=value ..." line per cycle. Durations are in milliseconds."""
+
+    def __init__(self):
+        self.cycle = 0
+        self.values = {}
+
+    def begin(self):
+        self.cycle += 1
+        self.values.clear()
+
+    def start(self):
+        return time.monotonic_ns()
+
+    def stop(self, name, start):
+        self.add(name, (time.monotonic_ns() - start) // 1000000)
+
+    def add(self, name, value):
+        self.values[name] = self.values.get(name, 0) + value
+
+    def collect(self):
+        # gc.collect is timed as part of the cycle, followed by free memory
+        start = self.start()
+        gc.collect()
+        self.stop("gc", start)
+        if hasattr(gc, "mem_free"):
+            self.values["free"] = gc.mem_free()
+
+    def line(self):
+        parts = ["T cycle=" + str(self.cycle)]
+        for name in sorted(self.values):
+            parts.append(name + "=" + str(self.values[name]))
+        return " ".join(parts)
+
+    def overlay(self):
+        # Short enough for the bottom row of the screen
+        v = self.values
+        return "f{} p{} s{} r{} g{} c{} b{} m{}k".format(v.get("fetch", 0), v.get("parse", 0), v.get("sort", 0),
+            v.get("render", 0), v.get("gc", 0), v.get("cells", 0), v.get("bytes", 0), v.get("free", 0) // 1024)
+
+    def emit(self):
+        print(self.line())
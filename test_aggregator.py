@@ -0,0 +1,147 @@
+# Polls icinga.Aggregator and Endpoint against fake objects queries.
+# Desktop only:
+#   python3 -m pytest test_aggregator.py
+
+import json
+
+import icinga
+from problems import TopK, sort_key
+
+class FakeResponse:
+    def __init__(self, status_code, body):
+        self.status_code = status_code
+        self.body = body
+        self.text = body.decode()
+
+    def iter_content(self, chunk_size):
+        for i in range(0, len(self.body), chunk_size):
+            yield self.body[i:i + chunk_size]
+
+    def close(self):
+        pass
+
+class FakeSession:
+    """Answers the services and hosts queries from lists of items. Set
+    error to an exception to raise it, or status_code to fail with it."""
+
+    def __init__(self, items):
+        self.items = items
+        self.error = None
+        self.status_code = 200
+        self.gets = 0
+
+    def get(self, url, headers=None, stream=False, timeout=None):
+        self.gets += 1
+        if self.error is not None:
+            raise self.error
+        if self.status_code != 200:
+            return FakeResponse(self.status_code, b"Internal Server Error")
+        kind = "Host" if "/hosts" in url else "Service"
+        results = [{"type": t, "name": name, "attrs": {"state": float(state), "last_hard_state_change": changed}}
+            for t, name, state, changed in self.items if t == kind]
+        return FakeResponse(200, json.dumps({"results": results}).encode())
+
+def endpoint(host, items, interval=30, size=20):
+    session = FakeSession(items)
+    return session, icinga.Endpoint(icinga.IcingaClient(session, host, "dXNlcjpwYXNz"), interval, size)
+
+def kept(top):
+    return [top.store.get(slot) for slot in top.slots]
+
+def test_merge_order():
+    a_items = [
+        ("Service", "web!http", 1, 100),
+        ("Service", "web!disk", 2, 300),
+        ("Host", "db", 1, 50),
+    ]
+    b_items = [
+        ("Service", "mail!smtp", 2, 300),
+        ("Service", "mail!imap", 2, 400),
+        ("Host", "edge", 1, 60),
+    ]
+    a_session, a = endpoint("a.example", a_items)
+    b_session, b = endpoint("b.example", b_items)
+    aggregator = icinga.Aggregator([a, b])
+    assert aggregator.poll(0)
+
+    top = TopK(20)
+    aggregator.merge(top)
+    assert top.count == 6
+    # Worst first, ties in endpoint order: web!disk and mail!smtp share a key
+    assert kept(top) == [
+        ("Host", "edge", 1, 60),
+        ("Host", "db", 1, 50),
+        ("Service", "mail!imap", 2, 400),
+        ("Service", "web!disk", 2, 300),
+        ("Service", "mail!smtp", 2, 300),
+        ("Service", "web!http", 1, 100),
+    ]
+    assert [sort_key(item) for item in kept(top)] == sorted(sort_key(item) for item in a_items + b_items)
+
+def test_merge_keeps_size():
+    items = [("Service", "web!s" + str(i), 2, i) for i in range(10)]
+    a_session, a = endpoint("a.example", items[:5], size=3)
+    b_session, b = endpoint("b.example", items[5:], size=3)
+    aggregator = icinga.Aggregator([a, b])
+    aggregator.poll(0)
+    top = TopK(3)
+    aggregator.merge(top)
+    assert top.count == 10
+    assert top.overflow() == 7
+    assert [item[1] for item in kept(top)] == ["web!s9", "web!s8", "web!s7"]
+
+def test_failing_endpoint_keeps_last_results():
+    a_session, a = endpoint("a.example", [("Service", "web!http", 2, 100)])
+    b_session, b = endpoint("b.example", [("Host", "edge", 1, 60)])
+    aggregator = icinga.Aggregator([a, b])
+    aggregator.poll(0)
+    assert aggregator.errors() == []
+
+    b_session.error = OSError("Connection refused")
+    assert aggregator.poll(1000)
+    assert aggregator.errors() == ["b.example: Connection refused"]
+    assert aggregator.failures() == 1
+    top = TopK(20)
+    aggregator.merge(top)
+    assert [item[1] for item in kept(top)] == ["edge", "web!http"]
+
+    # The same error again is no change
+    assert not aggregator.poll(3000)
+
+    b_session.error = None
+    b_session.status_code = 500
+    assert aggregator.poll(6000)
+    assert aggregator.errors() == ["b.example: Internal Server Error"]
+    assert b.top.count == 1
+
+    b_session.status_code = 200
+    assert aggregator.poll(9000)
+    assert aggregator.errors() == []
+    assert aggregator.failures() == 0
+
+def test_per_endpoint_next_poll():
+    a_session, a = endpoint("a.example", [("Service", "web!http", 2, 100)], interval=30)
+    b_session, b = endpoint("b.example", [], interval=60)
+    aggregator = icinga.Aggregator([a, b])
+    aggregator.poll(0)
+    assert aggregator.polled == [a, b]
+    # A change with problems polls fast, a change without at the interval
+    assert a.next_poll == 10
+    assert b.next_poll == 60
+    assert aggregator.next_poll() == 10
+
+    assert not aggregator.poll(10)
+    assert aggregator.polled == [a]
+    assert (a_session.gets, b_session.gets) == (4, 2)
+    assert a.next_poll == 10 + 30
+
+    assert not aggregator.poll(39)
+    assert aggregator.polled == []
+
+    b_session.error = OSError("timed out")
+    aggregator.poll(60)
+    assert aggregator.polled == [a, b]
+    # Stable results stretch a's delay; b backs off with jitter from its
+    # own interval
+    assert a.next_poll == 60 + 45
+    assert 60 + 30 <= b.next_poll <= 60 + 60
@@ -0,0 +1,185 @@
+# Feeds newline-delimited Icinga2 events through IcingaClient.events and
+# ProblemSet.apply with a fake session. Desktop only:
+#   python3 -m pytest test_events.py
+
+import json
+
+import pytest
+
+import icinga
+from problems import ProblemSet
+
+class FakeResponse:
+    def __init__(self, status_code, body, chunk_size):
+        self.status_code = status_code
+        self.body = body
+        self.chunk_size = chunk_size
+        self.closed = False
+
+    def iter_content(self, chunk_size):
+        # Ignores the requested size so lines split across chunks
+        for i in range(0, len(self.body), self.chunk_size):
+            yield self.body[i:i + self.chunk_size]
+
+    def close(self):
+        self.closed = True
+
+class FakeSession:
+    def __init__(self, events, status_code=200, chunk_size=7):
+        lines = [json.dumps(event).encode() for event in events]
+        # Icinga2 may send blank keep-alive lines between events
+        self.body = b"\n\n".join(lines) + b"\n"
+        self.status_code = status_code
+        self.chunk_size = chunk_size
+        self.posts = []
+        self.response = None
+
+    def post(self, url, json=None, headers=None, stream=False):
+        self.posts.append((url, json, headers, stream))
+        self.response = FakeResponse(self.status_code, self.body, self.chunk_size)
+        return self.response
+
+def state_change(host, state, state_type=1, service=None, timestamp=1600000000):
+    event = {"type": "StateChange", "host": host, "state": float(state), "state_type": float(state_type), "timestamp": timestamp}
+    if service is not None:
+        event["service"] = service
+    return event
+
+def check_result(host, state, state_type=1, service=None, timestamp=1600000000):
+    event = {"type": "CheckResult", "host": host, "timestamp": timestamp,
+        "check_result": {"vars_after": {"state": float(state), "state_type": float(state_type)}}}
+    if service is not None:
+        event["service"] = service
+    return event
+
+def stream(events, **kwargs):
+    session = FakeSession(events, **kwargs)
+    client = icinga.IcingaClient(session, "icinga.example", "dXNlcjpwYXNz")
+    return session, list(client.events("panel"))
+
+def test_events_split_across_chunks():
+    events = [state_change("web", 1), check_result("db", 2, service="disk")]
+    for chunk_size in (1, 3, 7, 64, 4096):
+        session, received = stream(events, chunk_size=chunk_size)
+        assert received == events
+        assert session.response.closed
+
+def test_events_request():
+    session, received = stream([])
+    url, body, headers, streamed = session.posts[0]
+    assert url == "https://icinga.example/v1/events"
+    assert body == {"queue": "panel", "types": icinga.EVENT_TYPES}
+    assert headers["Authorization"] == "Basic dXNlcjpwYXNz"
+    assert streamed
+    assert received == []
+
+def test_events_error_status():
+    session = FakeSession([], status_code=401)
+    client = icinga.IcingaClient(session, "icinga.example", "dXNlcjpwYXNz")
+    with pytest.raises(RuntimeError):
+        list(client.events("panel"))
+    assert session.response.closed
+
+def test_apply_streamed_service_events():
+    events = [
+        state_change("web", 2, service="http", timestamp=100), # enters
+        state_change("web", 2, service="http", timestamp=110), # no change
+        state_change("web", 1, service="http", timestamp=120), # critical to warning
+        state_change("web", 2, state_type=0, service="http", timestamp=130), # soft, skipped
+        state_change("web", 0, service="http", timestamp=140), # leaves
+        state_change("web", 0, service="http", timestamp=150), # already gone
+    ]
+    session, received = stream(events)
+    problems = ProblemSet()
+    results = []
+    for event in received:
+        results.append(problems.apply(event))
+        if event["timestamp"] == 120:
+            assert problems.items == {("Service", "web!http"): (1, 120)}
+    assert results == [True, False, True, False, True, False]
+    assert problems.items == {}
+
+def test_apply_soft_check_result_skipped():
+    problems = ProblemSet()
+    assert not problems.apply(check_result("web", 2, state_type=0, service="http"))
+    assert problems.items == {}
+
+def test_apply_host_check_result_mapping():
+    problems = ProblemSet()
+    # Host check results carry service-style states: 0 and 1 are up
+    assert not problems.apply(check_result("db", 1, timestamp=100))
+    assert problems.apply(check_result("db", 2, timestamp=110))
+    assert problems.items == {("Host", "db"): (1, 110)}
+    assert not problems.apply(check_result("db", 3, timestamp=120))
+    assert problems.apply(check_result("db", 1, timestamp=130))
+    assert problems.items == {}
+
+def test_apply_host_state_change_and_other_events():
+    problems = ProblemSet()
+    assert problems.apply(state_change("db", 1, timestamp=100))
+    assert problems.items == {("Host", "db"): (1, 100)}
+    assert not problems.apply({"type": "Notification", "host": "db"})
+    assert not problems.apply({"type": "StateChange", "host": "db", "state": 1.0})
+
+class SnapshotSession(FakeSession):
+    """Serves one critical service to the objects queries, and raises its
+    recovery on the event stream while the hosts query is in flight."""
+
+    def __init__(self, recovery):
+        super().__init__([])
+        self.recovery = recovery
+        self.calls = []
+
+    def post(self, url, json=None, headers=None, stream=False):
+        self.calls.append("post")
+        response = super().post(url, json, headers, stream)
+        response.body = b""
+        return response
+
+    def get(self, url, headers=None, stream=False, timeout=None):
+        self.calls.append("get")
+        if "/hosts" in url:
+            if self.response is not None:
+                self.response.body += json.dumps(self.recovery).encode() + b"\n"
+            results = []
+        else:
+            results = [{"type": "Service", "name": "web!http", "attrs": {"state": 2.0, "last_hard_state_change": 100}}]
+        return FakeResponse(200, json.dumps({"results": results}).encode(), 64)
+
+def test_event_during_snapshot_applied():
+    session = SnapshotSession(state_change("web", 0, service="http", timestamp=110))
+    client = icinga.IcingaClient(session, "icinga.example", "dXNlcjpwYXNz")
+    problems = ProblemSet()
+    # The order main.stream follows: subscribe, snapshot, then events
+    response = client.subscribe("panel")
+    assert client.fetch(problems.add) is None
+    assert session.calls == ["post", "get", "get"]
+    assert problems.items == {("Service", "web!http"): (2, 100)}
+
+    results = [problems.apply(event) for event in client.read_events(response)]
+    assert results == [True]
+    assert problems.items == {}
+    assert response.closed
+
+def test_subscribe_error_status_closes():
+    session = FakeSession([], status_code=503)
+    client = icinga.IcingaClient(session, "icinga.example", "dXNlcjpwYXNz")
+    with pytest.raises(RuntimeError):
+        client.subscribe("panel")
+    assert session.response.closed
+
+def test_apply_excluded_events_remove():
+    problems = ProblemSet(exclude_acknowledged=True, exclude_downtimed=True)
+    acknowledged = dict(state_change("web", 2, service="http", timestamp=100), acknowledgement=True)
+    assert not problems.apply(acknowledged)
+    assert problems.items == {}
+
+    assert problems.apply(state_change("web", 2, service="http", timestamp=110))
+    downtimed = dict(check_result("web", 2, service="http", timestamp=120), downtime_depth=1.0)
+    assert problems.apply(downtimed)
+    assert problems.items == {}
+
+    # Without the options both are shown as usual
+    problems = ProblemSet()
+    assert problems.apply(acknowledged)
+    assert not problems.apply(downtimed)
@@ -0,0 +1,86 @@
+# Checks the streaming results splitter against json.loads on large
+# synthetic payloads cut into chunks. Desktop only:
+#   python3 -m pytest test_jsonstream.py
+
+import json
+import random
+
+import pytest
+
+import jsonstream
+
+# Quotes, backslashes, brackets and non-ASCII inside strings must not be
+# mistaken for structure
+AWKWARD = ['"', "\\", "\\\"", "{", "}", "[", "]", ",", ":", "é", "☃", "\n", "\t", "\\n", "results"]
+
+def random_name(rng):
+    parts = []
+    for i in range(rng.randrange(1, 8)):
+        if rng.random() < 0.3:
+            parts.append(rng.choice(AWKWARD))
+        else:
+            parts.append("".join(rng.choice("abcdefghij-_.0123456789") for j in range(rng.randrange(1, 12))))
+    return "".join(parts)
+
+def random_payload(rng, count):
+    results = []
+    for i in range(count):
+        item = {
+            "type": rng.choice(["Host", "Service"]),
+            "name": random_name(rng) + "!" + random_name(rng),
+            "attrs": {
+                "state": float(rng.randrange(4)),
+                "last_hard_state_change": rng.randrange(1, 2 ** 31) + rng.choice([0, 0.5]),
+                "vars": {"notes": random_name(rng), "list": [random_name(rng), [1, {"x": "]"}]]},
+            },
+            "joins": {},
+            "meta": {},
+        }
+        results.append(item)
+    body = json.dumps({"results": results}, ensure_ascii=rng.random() < 0.5)
+    return body.encode("utf-8"), results
+
+def expected(results):
+    return [jsonstream.parse_item(json.dumps(item).encode()) for item in results]
+
+def random_chunks(rng, payload, low, high):
+    i = 0
+    while i < len(payload):
+        n = rng.randrange(low, high + 1)
+        yield payload[i:i + n]
+        i += n
+
+def test_large_payloads_random_chunks():
+    rng = random.Random(7)
+    for trial in range(30):
+        payload, results = random_payload(rng, rng.randrange(200, 600))
+        want = expected(results)
+        for low, high in ((1, 3), (1, 64), (256, 1024), (4096, 65536)):
+            got = list(jsonstream.iter_results(random_chunks(rng, payload, low, high)))
+            assert got == want
+
+def test_split_at_every_quote_and_escape():
+    rng = random.Random(11)
+    payload, results = random_payload(rng, 40)
+    want = expected(results)
+    for i in range(1, len(payload)):
+        if payload[i - 1] in b'"\\' or payload[i] in b'"\\':
+            got = list(jsonstream.iter_results([payload[:i], payload[i:]]))
+            assert got == want, i
+
+def test_elements_match_json_loads():
+    rng = random.Random(3)
+    payload, results = random_payload(rng, 300)
+    elements = list(jsonstream.iter_results(random_chunks(rng, payload, 1, 512), parse=json.loads))
+    assert elements == json.loads(payload)["results"]
+
+def test_empty_results():
+    assert list(jsonstream.iter_results([b'{"res', b'ults": [', b"]}"])) == []
+
+def test_truncated_payload():
+    rng = random.Random(5)
+    payload, results = random_payload(rng, 20)
+    with pytest.raises(ValueError):
+        list(jsonstream.iter_results(random_chunks(rng, payload[:len(payload) // 2], 1, 100)))
+    with pytest.raises(ValueError):
+        list(jsonstream.iter_results([b'{"error": 404}']))
@@ -0,0 +1,84 @@
+# Checks problems.TopK and sort_key against the string sort key main.py
+# used before them. Desktop only:
+#   python3 -m pytest test_problems.py
+
+import random
+
+from problems import TopK, sort_key
+
+def item_key(item):
+    # The original key, taking the (type, name, state, time) items TopK
+    # does instead of the API's result dicts
+    item_type, name, state, last_hard_state_change = item
+    last_hard_state_change_key = str(9999999999 - last_hard_state_change)
+
+    # Sort hosts before services
+    if item_type == "Host":
+        # Sort hosts by state: down, unreachable, up
+        state_key = 9
+        if state == 1: # Down
+            state_key = 0
+        elif state == 2: # Unreachable
+            state_key = 1
+
+        return "0" + "_" + str(state_key) + "_" + last_hard_state_change_key
+    else:
+        # Sort services by state: critical, known, warning, ok
+        state_key = 9
+        if state == 2: # Critital
+            state_key = 0
+        elif state == 3: # Unknown
+            state_key = 1
+        elif state == 1: # Warning
+            state_key = 2
+
+        return "1" + "_" + str(state_key) + "_" + last_hard_state_change_key
+
+def random_items(rng, count):
+    items = []
+    for i in range(count):
+        # A narrow time range, so many items tie on the whole key
+        changed = 1600000000 + rng.randrange(8)
+        if rng.random() < 0.3:
+            items.append(("Host", "host-" + str(i), rng.randrange(4), changed))
+        else:
+            items.append(("Service", "host-" + str(i % 7) + "!service-" + str(i), rng.randrange(5), changed))
+    return items
+
+def kept(top):
+    return [top.store.get(slot) for slot in top.slots]
+
+def test_sort_key_matches_item_key():
+    rng = random.Random(1)
+    for trial in range(50):
+        items = random_items(rng, 40)
+        assert sorted(items, key=sort_key) == sorted(items, key=item_key)
+
+def test_topk_matches_item_key_sort():
+    rng = random.Random(2)
+    for trial in range(50):
+        items = random_items(rng, rng.randrange(1, 120))
+        for size in (1, 10, 50):
+            top = TopK(size)
+            for item in items:
+                top.add(item)
+            assert top.count == len(items)
+            # Equal keys stay in the order added, as in a stable sort
+            assert kept(top) == sorted(items, key=item_key)[:size]
+
+def test_topk_reset_and_merge_match_item_key_sort():
+    rng = random.Random(3)
+    merged = TopK(30)
+    parts = [TopK(30) for p in range(3)]
+    for trial in range(20):
+        everything = []
+        for part in parts:
+            part.reset()
+            items = random_items(rng, rng.randrange(0, 60))
+            for item in items:
+                part.add(item)
+            everything += sorted(items, key=item_key)[:30]
+        merged.reset()
+        for part in parts:
+            merged.merge(part)
+        assert kept(merged) == sorted(everything, key=item_key)[:30]
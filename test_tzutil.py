@@ -0,0 +1,65 @@
+# Checks tzutil against CPython's zoneinfo. Desktop only:
+#   python3 -m pytest test_tzutil.py
+
+import calendar
+import datetime
+import zoneinfo
+
+import tzutil
+
+CHICAGO = zoneinfo.ZoneInfo("America/Chicago")
+STEP = 30 * 60
+
+def expected(utc):
+    local = datetime.datetime.fromtimestamp(utc, CHICAGO)
+    return local.timetuple()[:6] + (bool(local.dst()),)
+
+def actual(utc):
+    t = tzutil.US_Central.localtime(utc)
+    return tuple(t)[:6] + (bool(t.tm_isdst),)
+
+def year_start(year):
+    return calendar.timegm((year, 1, 1, 0, 0, 0))
+
+def check_range(first_year, last_year):
+    mismatches = []
+    for utc in range(year_start(first_year), year_start(last_year + 1), STEP):
+        if actual(utc) != expected(utc):
+            mismatches.append(utc)
+    assert mismatches == []
+
+def transitions(first_year, last_year):
+    # UTC times where the offset changes, found hourly then by bisection
+    found = []
+    utc = year_start(first_year)
+    end = year_start(last_year + 1)
+    previous = expected(utc)[6]
+    while utc < end:
+        dst = expected(utc + 3600)[6]
+        if dst != previous:
+            lo, hi = utc, utc + 3600
+            while hi - lo > 1:
+                mid = (lo + hi) // 2
+                if expected(mid)[6] == dst:
+                    hi = mid
+                else:
+                    lo = mid
+            found.append(hi)
+            previous = dst
+        utc += 3600
+    return found
+
+def test_table_range():
+    # 2007 onwards follows the current US rule
+    check_range(2007, tzutil.MRuleTimeZone.last_year)
+
+def test_beyond_table():
+    check_range(tzutil.MRuleTimeZone.last_year + 1, 2060)
+
+def test_transitions():
+    for first_year, last_year in ((2007, tzutil.MRuleTimeZone.last_year), (tzutil.MRuleTimeZone.last_year + 1, 2060)):
+        found = transitions(first_year, last_year)
+        assert len(found) == 2 * (last_year - first_year + 1)
+        for utc in found:
+            for t in (utc - 1, utc, utc + 1):
+                assert actual(t) == expected(t), t
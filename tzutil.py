@@ -35,8 +35,27 @@ class TzInfo:
         return time.struct_time(r[:8] + (is_dst,))
 
 class MRuleTimeZone(TzInfo):
+    # Years covered by the precomputed transition table
+    first_year = 2000
+    last_year = 2037
+
     @classmethod
     def dstrule(cls, utc):
+        if cls._table is None:
+            cls._build_table()
+        table = cls._table
+        if table[0] <= utc < table[-1]:
+            # Count of transitions at or before utc
+            lo = 0
+            hi = len(table)
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if table[mid] <= utc:
+                    lo = mid + 1
+                else:
+                    hi = mid
+            return cls._table_dst[lo - 1] == 1
+
         r = gmtime(utc - cls.timezone)
         cls._calc(r.tm_year)
         if cls._north:
@@ -54,10 +73,20 @@ class MRuleTimeZone(TzInfo):
         )
         cls._north = cls._change[0] < cls._change[1]
 
+    @classmethod
+    def _build_table(cls):
+        transitions = []
+        for year in range(cls.first_year, cls.last_year + 1):
+            transitions.append((cls._calc1(year, cls.timezone, *cls.start), 1))
+            transitions.append((cls._calc1(year, cls.altzone, *cls.end), 0))
+        transitions.sort()
+        cls._table = [t[0] for t in transitions]
+        cls._table_dst = bytes([t[1] for t in transitions])
+
     @classmethod
     def _calc1(cls, year, offset, m, n, d):
-        year = year - EPOCH_YEAR
         yleap = isleap(year)
+        year = year - EPOCH_YEAR
         days = (year * 365 + 
             (year - 1 + EPOCH_YEARS_SINCE_LEAP) // 4 -
             (year - 1 + EPOCH_YEARS_SINCE_CENTURY) // 100 +
@@ -84,6 +113,8 @@ class MRuleTimeZone(TzInfo):
     _year = None
     _north = None
     _change = None
+    _table = None
+    _table_dst = None
 
 class US_Central(MRuleTimeZone):
     tzname = ('CST', 'CDT')